@@ -1,29 +1,132 @@
 import sqlite3
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence
+
+from database.changes import ChangeWatcher
+from database.connection import ReadPool
 
 class EmailAPI:
     def __init__(self, db_name: str = "veeam_emails.db"):
         self.db_name = db_name
+        # Conexões somente leitura reaproveitadas entre as requisições
+        self.pool = ReadPool(db_name)
+        # Versão dos dados para os ETags, sem consultar as tabelas a cada requisição
+        self.changes = ChangeWatcher(db_name)
 
     def _execute_query(self, query: str, params: tuple = (), fetch_all: bool = True) -> List[Dict]:
-        try:
-            with sqlite3.connect(self.db_name) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                rows = cursor.fetchall() if fetch_all else [cursor.fetchone()]
-                return [dict(row) for row in rows if row]
-        except sqlite3.OperationalError as e:
-            return [{"error": f"Erro operacional no banco de dados: {str(e)}"}]
+        """Linhas da consulta como dicts; erros do SQLite (ex.: ``database is locked``) propagam para a rota"""
+        with self.pool.connection() as conn:
+            cursor = conn.execute(query, params)
+            rows = cursor.fetchall() if fetch_all else [cursor.fetchone()]
+            return [dict(row) for row in rows if row]
 
     # 📩 Tabela emails
     def get_all_emails(self) -> List[Dict]:
         return self._execute_query('''
             SELECT id, subject, date, sent_time, processed_date, is_processed
             FROM emails
-            ORDER BY date DESC, sent_time DESC
+            ORDER BY COALESCE(date, '') DESC, COALESCE(sent_time, '') DESC, id DESC
         ''')
 
+    # Colunas de backup_jobs mais o start_time separado em data e hora (HH:MM) no primeiro
+    # espaço, como o dashboard espera; ordem da busca por email_id (índice da chave natural)
+    JOBS_WITH_DATA_HORA = '''
+        SELECT *,
+               CASE WHEN instr(start_time, ' ') THEN substr(start_time, 1, instr(start_time, ' ') - 1)
+                    ELSE COALESCE(start_time, '') END AS data,
+               CASE WHEN instr(start_time, ' ') THEN substr(substr(start_time, instr(start_time, ' ') + 1), 1,
+                    min(5, instr(substr(start_time, instr(start_time, ' ') + 1) || ' ', ' ') - 1))
+                    ELSE '' END AS hora
+        FROM backup_jobs
+        {where}
+        ORDER BY email_id, job_name, start_time, end_time, created_by, created_at
+    '''
+
+    def get_all_emails_with_jobs(self) -> List[Dict]:
+        """Todos os e-mails, cada um com seus backup_jobs, em duas consultas (não uma por e-mail)"""
+        emails = self.get_all_emails()
+        jobs = self._execute_query(self.JOBS_WITH_DATA_HORA.format(where=""))
+        return self._nest(emails, 'backup_jobs', jobs)
+
+    def get_emails_page(self, limit: int, after: Optional[Sequence] = None) -> List[Dict]:
+        """Até ``limit`` e-mails, com seus backup_jobs, depois da chave ``after`` = (date, sent_time, id).
+
+        Ordem de get_all_emails; a chave percorre o índice idx_emails_keyset,
+        então o custo não depende do tamanho do histórico. date e sent_time
+        nulos contam como '' (vão para o fim), senão a comparação daria NULL e
+        o e-mail sumiria da paginação. A comparação vem por extenso porque o
+        SQLite não usa o índice de expressões em ``(a, b, c) < (?, ?, ?)``.
+        """
+        where, params = "", ()
+        if after:
+            date, sent_time, email_id = after
+            where = '''
+                WHERE COALESCE(date, '') <= COALESCE(?, '')
+                  AND (COALESCE(date, '') < COALESCE(?, '')
+                       OR (COALESCE(sent_time, ''), id) < (COALESCE(?, ''), ?))
+            '''
+            params = (date, date, sent_time, email_id)
+        emails = self._execute_query(f'''
+            SELECT id, subject, date, sent_time, processed_date, is_processed
+            FROM emails
+            {where}
+            ORDER BY COALESCE(date, '') DESC, COALESCE(sent_time, '') DESC, id DESC
+            LIMIT ?
+        ''', params + (limit,))
+        ids = [email['id'] for email in emails]
+        if not ids:
+            return emails
+        jobs = self._execute_query(
+            self.JOBS_WITH_DATA_HORA.format(where=f"WHERE email_id IN ({','.join('?' * len(ids))})"), tuple(ids)
+        )
+        return self._nest(emails, 'backup_jobs', jobs)
+
+    def _page_by_id(self, table: str, limit: int, after_id: Optional[int] = None) -> List[Dict]:
+        """Até ``limit`` linhas de ``table`` em ordem decrescente de id, com id menor que ``after_id``"""
+        where, params = ("WHERE id < ?", (after_id,)) if after_id is not None else ("", ())
+        return self._execute_query(f'''
+            SELECT * FROM {table}
+            {where}
+            ORDER BY id DESC
+            LIMIT ?
+        ''', params + (limit,))
+
+    @staticmethod
+    def _nest(emails: List[Dict], field: str, rows: List[Dict], drop_email_id: bool = False) -> List[Dict]:
+        """Agrupa ``rows`` por email_id em uma passada e guarda em ``email[field]`` (lista vazia se não houver)"""
+        by_email = {}
+        for row in rows:
+            email_id = row.pop('email_id', None) if drop_email_id else row.get('email_id')
+            by_email.setdefault(email_id, []).append(row)
+        for email in emails:
+            email[field] = by_email.get(email.get('id'), [])
+        return emails
+
+    def get_dashboard(self) -> List[Dict]:
+        """Carga inicial do dashboard: e-mails com backup_jobs, config_backups e backup_data (email_data).
+
+        Quatro consultas ao todo, qualquer que seja o número de e-mails; cada
+        lista vem na mesma ordem das rotas by-email correspondentes.
+        """
+        emails = self.get_all_emails_with_jobs()
+        configs = self._execute_query('''
+            SELECT * FROM config_backups
+            ORDER BY email_id, server, repository, backup_date, start_time, status
+        ''')
+        self._nest(emails, 'config_backups', configs)
+        try:
+            data = self._execute_query('''
+                SELECT email_id, host, ip, status, date
+                FROM email_data
+                ORDER BY email_id, host
+            ''')
+        except sqlite3.OperationalError as e:
+            # email_data não é criada por este projeto; sem a tabela, backup_data fica vazio.
+            # Outros erros (ex.: banco travado) não podem virar um backup_data vazio no cache
+            if "no such table" not in str(e):
+                raise
+            data = []
+        return self._nest(emails, 'backup_data', data, drop_email_id=True)
+
     def get_email_metadata(self, email_id: int) -> List[Dict]:
         return self._execute_query('''
             SELECT id, subject, date, sent_time, processed_date, is_processed
@@ -35,10 +138,19 @@ class EmailAPI:
         return self._execute_query('''
             SELECT id, subject, date, sent_time, processed_date, is_processed
             FROM emails
-            WHERE date(date) = date(?)
-            ORDER BY sent_time DESC
+            WHERE COALESCE(date, '') = date(?)
+            ORDER BY COALESCE(sent_time, '') DESC, id DESC
         ''', (date,))
 
+    def get_emails_in_range(self, start: int, end: int) -> List[Dict]:
+        """E-mails enviados em [start, end), epochs UTC"""
+        return self._execute_query('''
+            SELECT id, subject, date, sent_time, sent_at, processed_date, is_processed
+            FROM emails
+            WHERE sent_at >= ? AND sent_at < ?
+            ORDER BY sent_at DESC
+        ''', (start, end))
+
     # 📊 Tabela email_data
     def get_all_email_data(self) -> List[Dict]:
         return self._execute_query('''
@@ -59,9 +171,9 @@ class EmailAPI:
         return self._execute_query('''
             SELECT email_id, host, ip, status, date
             FROM email_data
-            WHERE date(date) = date(?)
+            WHERE date >= date(?) AND date < date(?, '+1 day')
             ORDER BY host
-        ''', (date,))
+        ''', (date, date))
 
     # 📦 Tabela backup_jobs
     def get_all_backup_jobs(self) -> List[Dict]:
@@ -70,6 +182,9 @@ class EmailAPI:
             ORDER BY id DESC
         ''')
 
+    def get_backup_jobs_page(self, limit: int, after_id: Optional[int] = None) -> List[Dict]:
+        return self._page_by_id("backup_jobs", limit, after_id)
+
     def get_backup_job(self, job_id: int) -> List[Dict]:
         return self._execute_query('''
             SELECT * FROM backup_jobs WHERE id = ?
@@ -80,6 +195,24 @@ class EmailAPI:
             SELECT * FROM backup_jobs WHERE email_id = ?
         ''', (email_id,))
 
+    def get_backup_jobs_with_errors(self) -> List[Dict]:
+        return self._execute_query('''
+            SELECT * FROM backup_jobs WHERE summary_error = 1
+        ''')
+
+    def get_backup_jobs_with_errors_by_email(self, email_id: int) -> List[Dict]:
+        return self._execute_query('''
+            SELECT * FROM backup_jobs WHERE summary_error = 1 AND email_id = ?
+        ''', (email_id,))
+
+    def get_backup_jobs_in_range(self, start: int, end: int) -> List[Dict]:
+        """Jobs iniciados em [start, end), epochs UTC"""
+        return self._execute_query('''
+            SELECT * FROM backup_jobs
+            WHERE started_at >= ? AND started_at < ?
+            ORDER BY started_at DESC
+        ''', (start, end))
+
     # 🖥️ Tabela backup_vms
     def get_vms_by_job(self, job_id: int) -> List[Dict]:
         return self._execute_query('''
@@ -92,6 +225,17 @@ class EmailAPI:
             ORDER BY id DESC
         ''')
 
+    def get_vms_page(self, limit: int, after_id: Optional[int] = None) -> List[Dict]:
+        return self._page_by_id("backup_vms", limit, after_id)
+
+    def get_vms_in_range(self, start: int, end: int) -> List[Dict]:
+        """VMs iniciadas em [start, end), epochs UTC"""
+        return self._execute_query('''
+            SELECT * FROM backup_vms
+            WHERE started_at >= ? AND started_at < ?
+            ORDER BY started_at DESC
+        ''', (start, end))
+
     # 🔧 Tabela config_backups
     def get_all_config_backups(self) -> List[Dict]:
         return self._execute_query('''
@@ -99,6 +243,9 @@ class EmailAPI:
             ORDER BY id DESC
         ''')
 
+    def get_config_backups_page(self, limit: int, after_id: Optional[int] = None) -> List[Dict]:
+        return self._page_by_id("config_backups", limit, after_id)
+
     def get_config_backup(self, config_id: int) -> List[Dict]:
         return self._execute_query('''
             SELECT * FROM config_backups WHERE id = ?
@@ -109,6 +256,70 @@ class EmailAPI:
             SELECT * FROM config_backups WHERE email_id = ?
         ''', (email_id,))
 
+    # 📈 Resumos diários
+    def get_daily_summary(self, start_day: str, end_day: str) -> List[Dict]:
+        """Totais por dia em [start_day, end_day] (YYYY-MM-DD)"""
+        return self._execute_query('''
+            SELECT * FROM daily_summary
+            WHERE day >= ? AND day <= ?
+            ORDER BY day
+        ''', (start_day, end_day))
+
+    def get_daily_job_summary(self, start_day: str, end_day: str) -> List[Dict]:
+        """Totais por job e dia em [start_day, end_day] (YYYY-MM-DD)"""
+        return self._execute_query('''
+            SELECT * FROM daily_job_summary
+            WHERE day >= ? AND day <= ?
+            ORDER BY day, job_name
+        ''', (start_day, end_day))
+
+    def get_monthly_vm_summary(self, start_month: str, end_month: str) -> List[Dict]:
+        """Totais por mês, job e VM das VMs compactadas pela retenção, em [start_month, end_month] (YYYY-MM)"""
+        return self._execute_query('''
+            SELECT * FROM monthly_vm_summary
+            WHERE month >= ? AND month <= ?
+            ORDER BY month, job_name, vm_name
+        ''', (start_month, end_month))
+
+    # 🔎 Busca textual
+    SEARCH_COLUMNS = {"vm": "vm_details", "job": "job_name", "config": "config_warnings"}
+
+    @staticmethod
+    def _fts_query(text: str, column: Optional[str] = None) -> str:
+        """Converte o texto digitado em uma consulta FTS5: todos os termos, o último como prefixo"""
+        terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+        if not terms:
+            return '""'
+        terms[-1] += "*"
+        query = " ".join(terms)
+        return f"{{{column}}} : ({query})" if column else query
+
+    def search(self, text: str, kind: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Resultados ordenados por relevância (bm25) em detalhes de VMs, nomes de jobs e avisos de config"""
+        # Só a página pedida é ordenada e enriquecida; a ordem final é refeita aqui
+        # para não ordenar no SQLite o que o índice FTS já entregou ordenado
+        rows = self._execute_query('''
+            WITH hits AS (
+                SELECT rowid, rank, snippet(search_index, -1, '[', ']', '…', 16) AS snippet
+                FROM search_index
+                WHERE search_index MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            )
+            SELECT CASE h.rowid & 3 WHEN 1 THEN 'vm' WHEN 2 THEN 'job' ELSE 'config' END AS type,
+                   h.rowid >> 2 AS id,
+                   COALESCE(v.name, j.job_name, 'Configuração: ' || c.server) AS title,
+                   COALESCE(v.job_id, j.id) AS job_id,
+                   COALESCE(vj.email_id, j.email_id, c.email_id) AS email_id,
+                   h.snippet, h.rank
+            FROM hits h
+            LEFT JOIN backup_vms v ON h.rowid & 3 = 1 AND v.id = h.rowid >> 2
+            LEFT JOIN backup_jobs vj ON vj.id = v.job_id
+            LEFT JOIN backup_jobs j ON h.rowid & 3 = 2 AND j.id = h.rowid >> 2
+            LEFT JOIN config_backups c ON h.rowid & 3 = 3 AND c.id = h.rowid >> 2
+        ''', (self._fts_query(text, self.SEARCH_COLUMNS.get(kind)), limit, offset))
+        return sorted(rows, key=lambda row: row.get("rank", 0))
+
     # 🔧 Tabela config_catalogs
     def get_catalogs_by_config(self, config_id: int) -> List[Dict]:
         return self._execute_query('''
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Set
+
+
+class ResponseCache:
+    """Cache LRU, em memória, das respostas já serializadas da API.
+
+    Cada entrada guarda as tabelas de que depende e vale para a versão de
+    change_version em que foi gerada. As gravações deste processo avisam
+    (invalidate) quais tabelas mudaram e só as entradas que dependem delas
+    saem; se a versão do banco avançar sem aviso (gravação de outro
+    processo, como o reparse), não há como saber o que mudou e tudo sai.
+
+    Gravações que nem somam na versão (tabelas de fora do projeto) só são
+    percebidas por quem lê o banco: a entrada guarda a marca (``stamp``)
+    recebida em put e deixa de valer quando get chega com outra.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # chave -> (corpo, tabelas, marca)
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key: Hashable, version: int, stamp: Hashable = None) -> Optional[bytes]:
+        with self._lock:
+            self._sync(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] != stamp:
+                self._remove(key)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, version: int, tables: Iterable[str], body: bytes, stamp: Hashable = None):
+        """Guarda a resposta gerada com os dados da ``version``; ignora se o banco já mudou desde então"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._sync(version)
+            if version != self._version:
+                return
+            self._remove(key)
+            self._entries[key] = (body, frozenset(tables), stamp)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tables: Set[str], version: int):
+        """Ouvinte de database.changes: remove as entradas que dependem de ``tables``"""
+        with self._lock:
+            if self._version is not None and version > self._version + 1:
+                # Houve versões no meio sem aviso (outro processo): não dá para saber o que mudou
+                self._clear()
+            else:
+                for key in [key for key, (_, deps, _) in self._entries.items() if deps & tables]:
+                    self._remove(key)
+                    self.invalidations += 1
+            if self._version is None or version > self._version:
+                self._version = version
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "invalidations": self.invalidations, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def _sync(self, version: int):
+        # Versão mais nova do que a última avisada: gravação que não passou por invalidate
+        if self._version is None or version > self._version:
+            self._clear()
+            self._version = version
+
+    def _clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
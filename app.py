@@ -16,31 +16,66 @@ from routes.email_routes import *
 
 # --- Integração com verificação de e-mails ---
 from utils.email_processor import EmailProcessor
-
-# Importe a classe para remoção de duplicados
-from database.database_cleaner import DuplicateRemover  # ajuste o caminho conforme seu projeto
+from utils.email_idle import EmailIdleWatcher
+from utils.email_coordinator import IngestionCoordinator, load_sources
+from utils.raw_archive import DEFAULT_ARCHIVE_DIR
+from database.database import DatabaseManager
 
 def email_checker():
+    sources_file = os.environ.get("EMAIL_SOURCES_FILE")
+    if sources_file:
+        # Várias contas/pastas verificadas em paralelo a cada ciclo
+        coordinator = IngestionCoordinator(
+            load_sources(sources_file),
+            fetch_batch_size=int(os.environ.get("EMAIL_FETCH_BATCH_SIZE", "500")),
+            parse_workers=int(os.environ.get("EMAIL_PARSE_WORKERS", "0")),
+            archive_dir=os.environ.get("EMAIL_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR),
+            max_per_host=int(os.environ.get("EMAIL_MAX_CONNECTIONS_PER_HOST", "4"))
+        )
+        while True:
+            coordinator.run_cycle()
+
+            print("⏳ Aguardando 4 horas para próxima verificação...")
+            time.sleep(14400)  # 4 horas
+
     processor = EmailProcessor(
         email=os.environ.get("EMAIL_USER"),
         password=os.environ.get("EMAIL_PASSWORD"),
-        target_sender=os.environ.get("EMAIL_TARGET_SENDER")
+        target_sender=os.environ.get("EMAIL_TARGET_SENDER"),
+        fetch_batch_size=int(os.environ.get("EMAIL_FETCH_BATCH_SIZE", "500")),
+        parse_workers=int(os.environ.get("EMAIL_PARSE_WORKERS", "0")),
+        archive_dir=os.environ.get("EMAIL_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR)
     )
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(base_dir, "database", "veeam_emails.db")
-    remover = DuplicateRemover(db_path)
+    if os.environ.get("EMAIL_IDLE", "").lower() in ("1", "true", "yes"):
+        try:
+            watcher = EmailIdleWatcher(processor)
+        except RuntimeError as e:
+            print(f"⚠️ {e}. Usando verificação periódica.")
+        else:
+            watcher.run_forever()
 
     while True:
-        print("🧹 Limpando registros duplicados no banco...")
-        remover.remove_all_duplicates()  # Faz a limpeza antes da verificação
-
         print("📧 Verificando novos e-mails...")
         processor.fetch_and_process()
 
         print("⏳ Aguardando 4 horas para próxima verificação...")
         time.sleep(14400)  # 4 horas
 
+def retention_worker(days: int):
+    # Compacta diariamente os detalhes de VMs antigos (ver database/retention.py)
+    db = DatabaseManager()
+    while True:
+        try:
+            stats = db.apply_retention(days, os.environ.get("VM_ARCHIVE_DB") or None)
+            print(f"🗜️ Retenção: {stats['vms']} VMs compactadas, {stats['pages']} páginas liberadas")
+        except Exception as e:
+            # Ex.: banco travado pela ingestão; os lotes já gravados ficam e o resto vai no próximo ciclo
+            print(f"❌ Erro na retenção de VMs: {e}")
+        time.sleep(86400)  # 1 dia
+
 if __name__ == '__main__':
     threading.Thread(target=email_checker, daemon=True).start()
+    if os.environ.get("VM_RETENTION_DAYS"):
+        threading.Thread(target=retention_worker, args=(int(os.environ["VM_RETENTION_DAYS"]),), daemon=True).start()
     app.run(host='0.0.0.0', port=5000, debug=True)
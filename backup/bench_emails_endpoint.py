@@ -0,0 +1,88 @@
+"""Benchmark de /api/emails/: quantidade de consultas e tempo por tamanho do banco.
+
+Uso (a partir da raiz do projeto):
+    python -m backup.bench_emails_endpoint [e-mails por rodada ...]
+
+Monta bancos temporários com tamanhos crescentes, chama a rota pelo cliente de
+teste do Flask e conta as consultas executadas no SQLite. Falha se a
+quantidade de consultas variar com o número de e-mails (volta do N+1).
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from api.email_api import EmailAPI
+from api.response_cache import ResponseCache
+from app import app
+from database.connection import ReadPool
+from database.database import DatabaseManager
+import routes.email_routes as email_routes
+
+JOBS_PER_EMAIL = 3
+
+
+class CountingPool(ReadPool):
+    """ReadPool que conta os SELECT executados nas suas conexões"""
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+        self.queries = 0
+
+    @contextmanager
+    def connection(self):
+        with super().connection() as conn:
+            conn.set_trace_callback(self._count)
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+
+    def _count(self, statement: str):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.queries += 1
+
+
+def populate(db_path: str, count: int):
+    DatabaseManager(db_path)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO emails (id, subject, date, sent_time, is_processed) VALUES (?, ?, ?, ?, 1)",
+            ((i, f"Relatório {i}", f"2024-01-{1 + i % 28:02d}", f"22:{i % 60:02d}:{i % 47:02d}")
+             for i in range(1, count + 1)))
+        conn.executemany(
+            "INSERT INTO backup_jobs (email_id, job_name, start_time) VALUES (?, ?, ?)",
+            ((i, f"JOB-{n}", f"01/01/2024 22:{n:02d}:00") for i in range(1, count + 1) for n in range(JOBS_PER_EMAIL)))
+    conn.close()
+
+
+def measure(db_path: str):
+    api = EmailAPI(db_path)
+    api.pool = pool = CountingPool(db_path)
+    email_routes.email_api = api
+    # Cache vazio: mede a rota de fato, não a resposta guardada do banco anterior
+    email_routes.response_cache = ResponseCache()
+    started = time.perf_counter()
+    response = app.test_client().get('/api/emails/')
+    elapsed = time.perf_counter() - started
+    pool.close()
+    return pool.queries, elapsed, len(response.get_json())
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000, 5000]
+    counts = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            db_path = os.path.join(tmp, f"emails_{size}.db")
+            populate(db_path, size)
+            queries, elapsed, returned = measure(db_path)
+            counts.add(queries)
+            print(f"⏱️ {size} e-mails ({returned} retornados): {queries} consultas em {elapsed * 1000:.0f} ms")
+    if len(counts) != 1:
+        print("❌ A quantidade de consultas cresce com o número de e-mails")
+        sys.exit(1)
+    print(f"✅ {counts.pop()} consultas, independente do tamanho do banco")
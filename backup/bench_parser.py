@@ -0,0 +1,121 @@
+"""Equivalência e benchmark: tokenizador de passada única x parser por regex.
+
+Uso (a partir da raiz do projeto):
+    python -m backup.bench_parser            # corpus sintético
+    python -m backup.bench_parser emails/    # também compara arquivos .eml/.txt da pasta
+"""
+import email
+import os
+import random
+import sys
+import time
+
+from utils.email_parser import EmailParser, tokenize_jobs_info
+
+
+def job_block(index: int, vm_count: int, agent: bool, rnd: random.Random) -> str:
+    kind = "hosts" if agent else "VMs"
+    lines = [
+        f"{'Agent ' if agent else ''}Backup job: JOB-{index}",
+        f"Created by CORP\\admin{index % 7} at 0{1 + index % 9}/01/2024 22:00:00.",
+        f"{vm_count} of {vm_count} {kind} processed",
+        f"*Success*\t{vm_count}\t*Start time*\t22:00:0{index % 10}\t*Total size*\t1,{index} TB\t*Backup size*\t12{index},3 GB",
+        "*Warning*\t0\t*End time*\t23:10:44\t*Data read*\t300,5 GB\t*Dedupe*\t1,3x",
+        f"*Error*\t{index % 2}\t*Duration*\t1:10:41\t*Transferred*\t110,2 GB\t*Compression*\t2,1x",
+        "Details",
+        "*Name*\t*Status*\t*Start time*\t*End time*\t*Size*\t*Read*\t*Transferred*\t*Duration*\t*Details*",
+    ]
+    for vm in range(vm_count):
+        status = rnd.choice(["Success", "Success", "Warning", "Error"])
+        details = "" if status == "Success" else f"Failed to  process disk {vm}: timeout"
+        lines.append(
+            f"vm{index}-{vm}\t{status}\t22:{vm % 60:02d}:10\t23:{vm % 60:02d}:00\t"
+            f"{vm + 1}0 GB\t{vm}5,5 GB\t1,{vm} GB\t0:29:50\t{details}"
+        )
+    return "\n".join(lines)
+
+
+def report_body(rnd: random.Random, job_count: int, vm_count: int) -> str:
+    header = "Veeam Backup & Replication\nSummary of backup jobs\n\n"
+    blocks = [job_block(j, vm_count, rnd.random() < 0.3, rnd) for j in range(job_count)]
+    if rnd.random() < 0.2:
+        blocks.append(blocks[0])  # job repetido no mesmo e-mail
+    return header + "\n\n".join(blocks) + "\n"
+
+
+def mutate(body: str, rnd: random.Random) -> str:
+    """Desvios do layout padrão que devem cair nos caminhos de fallback"""
+    lines = body.split("\n")
+    for _ in range(rnd.randint(1, 4)):
+        i = rnd.randrange(len(lines))
+        op = rnd.randrange(6)
+        if op == 0:
+            del lines[i]
+        elif op == 1 and lines[i]:
+            cut = rnd.randrange(len(lines[i]))
+            lines[i:i + 1] = [lines[i][:cut], lines[i][cut:]]
+        elif op == 2:
+            lines.insert(i, "")
+        elif op == 3:
+            lines[i] = lines[i] + " Backup job: X"
+        elif op == 4:
+            lines[i] = lines[i].rstrip("0123456789,. GBTx")
+        else:
+            lines[i] = lines[i].replace("\t", "  ")
+    text = "\n".join(lines)
+    return text.replace("\n", "\r\n") if rnd.random() < 0.1 else text
+
+
+def synthetic_corpus(seed: int = 1):
+    rnd = random.Random(seed)
+    corpus = [report_body(rnd, rnd.randint(1, 6), rnd.randint(0, 40)) for _ in range(300)]
+    corpus += [mutate(report_body(rnd, rnd.randint(1, 4), rnd.randint(0, 10)), rnd) for _ in range(3000)]
+    return corpus
+
+
+def load_folder(folder: str):
+    bodies = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.endswith(".eml"):
+            with open(path, "rb") as f:
+                bodies.append(EmailParser._extract_body(email.message_from_bytes(f.read())))
+        elif name.endswith(".txt"):
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                bodies.append(f.read())
+    return bodies
+
+
+def check_equivalence(bodies) -> int:
+    mismatches = 0
+    for body in bodies:
+        if tokenize_jobs_info(body) != EmailParser.extract_jobs_info(body):
+            mismatches += 1
+    return mismatches
+
+
+def benchmark(bodies, repeat: int = 3):
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for body in bodies:
+                fn(body)
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return best(EmailParser.extract_jobs_info), best(tokenize_jobs_info)
+
+
+if __name__ == "__main__":
+    bodies = synthetic_corpus()
+    for folder in sys.argv[1:]:
+        bodies += load_folder(folder)
+    mismatches = check_equivalence(bodies)
+    print(f"🔍 {len(bodies)} corpos comparados, {mismatches} divergências")
+
+    rnd = random.Random(2)
+    large = [report_body(rnd, 20, 200) for _ in range(20)]
+    regex_time, token_time = benchmark(large)
+    print(f"⏱️ E-mails grandes (20 jobs x 200 VMs): regex {regex_time:.3f}s | "
+          f"tokenizador {token_time:.3f}s | {regex_time / token_time:.1f}x")
+    sys.exit(1 if mismatches else 0)
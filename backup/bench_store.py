@@ -0,0 +1,68 @@
+"""Benchmark da gravação: um commit por registro x uma transação por lote.
+
+Uso (a partir da raiz do projeto):
+    python -m backup.bench_store [quantidade de e-mails]
+
+Grava o mesmo corpus sintético (jobs com muitas VMs) em dois bancos
+temporários e compara o tempo e as linhas resultantes.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from backup.bench_parser import report_body
+from database.database import DatabaseManager
+from utils.email_parser import PARSER_VERSION, parse_report
+
+BATCH_SIZE = 500
+
+
+def corpus(count: int):
+    rnd = random.Random(3)
+    return [(f"Relatório {i}", f"2024-01-{1 + i % 28:02d}", f"22:{i % 60:02d}:00",
+             parse_report(report_body(rnd, 5, 200))) for i in range(count)]
+
+
+def store_per_call(db: DatabaseManager, emails):
+    """Caminho antigo: cada store_* abre a própria conexão e faz o próprio commit"""
+    for subject, date, sent_time, parsed in emails:
+        email_id = db.store_email(subject, date, sent_time)
+        for job_info, vm_list in parsed["jobs"]:
+            job_id = db.store_job(email_id, job_info)
+            if job_id:
+                for vm in vm_list:
+                    db.store_vm_details(job_id, [vm])
+        db.mark_email_processed(email_id, PARSER_VERSION, parsed["kind"])
+
+
+def store_batched(db: DatabaseManager, emails):
+    for start in range(0, len(emails), BATCH_SIZE):
+        with db.transaction():
+            for subject, date, sent_time, parsed in emails[start:start + BATCH_SIZE]:
+                email_id = db.store_email(subject, date, sent_time)
+                db.store_report(email_id, parsed, PARSER_VERSION)
+
+
+def row_counts(db: DatabaseManager):
+    with db._connect() as conn:
+        return [conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("emails", "backup_jobs", "backup_vms")]
+
+
+if __name__ == "__main__":
+    emails = corpus(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        counts = {}
+        for name, store in (("por chamada", store_per_call), ("em lote", store_batched)):
+            db = DatabaseManager(os.path.join(tmp, f"{store.__name__}.db"))
+            started = time.perf_counter()
+            store(db, emails)
+            timings[name] = time.perf_counter() - started
+            counts[name] = row_counts(db)
+        for name, elapsed in timings.items():
+            print(f"⏱️ {name}: {elapsed:.2f}s | e-mails, jobs, VMs = {counts[name]}")
+        print(f"🚀 {timings['por chamada'] / timings['em lote']:.1f}x mais rápido em lote")
+        sys.exit(0 if counts["por chamada"] == counts["em lote"] else 1)
@@ -0,0 +1,77 @@
+"""Verifica que percorrer as listagens página a página devolve a listagem completa.
+
+Uso (a partir da raiz do projeto):
+    python -m backup.check_keyset_pages [tamanho da página]
+
+Monta um banco temporário com e-mails de mesma data e hora (desempate pelo id)
+e com date ou sent_time nulos, segue o next_cursor de cada listagem paginada
+pelo cliente de teste do Flask e falha se a sequência de ids diferir da
+resposta sem paginação.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+from api.email_api import EmailAPI
+from api.response_cache import ResponseCache
+from app import app
+from database.database import DatabaseManager
+import routes.email_routes as email_routes
+
+LISTINGS = ('/api/emails/', '/api/backup-jobs/', '/api/backup-vms/', '/api/config-backups/')
+
+# (date, sent_time) dos e-mails; os nulos precisam aparecer nas páginas como na listagem completa
+EMAIL_KEYS = [("2024-01-02", "10:00:00"), ("2024-01-02", "10:00:00"), (None, "09:00:00"), ("2024-01-01", None),
+              (None, None), ("2024-01-03", "08:00:00"), ("2024-01-01", None), (None, None), ("2024-01-01", "23:59:59")]
+
+
+def populate(db_path: str):
+    DatabaseManager(db_path)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany("INSERT INTO emails (id, subject, date, sent_time, is_processed) VALUES (?, ?, ?, ?, 1)",
+                         ((i, f"Relatório {i}", date, sent_time) for i, (date, sent_time) in enumerate(EMAIL_KEYS, 1)))
+        for email_id in range(1, len(EMAIL_KEYS) + 1):
+            job_id = conn.execute("INSERT INTO backup_jobs (email_id, job_name) VALUES (?, ?)",
+                                  (email_id, f"JOB-{email_id}")).lastrowid
+            conn.executemany("INSERT INTO backup_vms (job_id, name) VALUES (?, ?)",
+                             ((job_id, f"VM-{n}") for n in range(3)))
+            conn.execute("INSERT INTO config_backups (email_id, server) VALUES (?, ?)", (email_id, f"SRV-{email_id}"))
+    conn.close()
+
+
+def walk(client, path: str, limit: int):
+    ids, cursor = [], None
+    while True:
+        args = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        page = client.get(path, query_string=args).get_json()
+        ids += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def check(db_path: str, limit: int) -> int:
+    populate(db_path)
+    email_routes.email_api = EmailAPI(db_path)
+    email_routes.response_cache = ResponseCache()
+    client = app.test_client()
+    failures = 0
+    for path in LISTINGS:
+        expected = [item['id'] for item in client.get(path).get_json()]
+        paged = walk(client, path, limit)
+        ok = paged == expected
+        print(f"{'✅' if ok else '❌'} {path}: {len(paged)} ids nas páginas, {len(expected)} na listagem completa")
+        if not ok:
+            print(f"   páginas: {paged}\n   completa: {expected}")
+            failures += 1
+    return failures
+
+
+if __name__ == "__main__":
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = check(os.path.join(tmp, "pages.db"), page_size)
+    print(f"{'❌' if failures else '✅'} {failures} listagens com páginas diferentes da listagem completa")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,93 @@
+"""Verifica, via EXPLAIN QUERY PLAN, que as consultas da API usam índices.
+
+Uso (a partir da raiz do projeto):
+    python -m backup.check_query_plans
+
+Cria um banco temporário com todas as migrações, chama cada método get_* (e a
+busca) do EmailAPI e falha se algum plano varre a tabela (SCAN) em vez de buscar por
+índice (SEARCH) ou ordena em uma B-tree temporária. As listagens completas
+(get_all_* e get_dashboard) podem percorrer a tabela inteira, mas sem ordenação temporária.
+"""
+import inspect
+import os
+import sqlite3
+import sys
+import tempfile
+
+from api.email_api import EmailAPI
+from database.database import DatabaseManager
+
+SAMPLE_ARGS = {"email_id": 1, "job_id": 1, "config_id": 1, "date": "2024-01-01", "start": 0, "end": 86400,
+               "start_day": "2024-01-01", "end_day": "2024-01-31",
+               "start_month": "2024-01", "end_month": "2024-06", "text": "timeout", "kind": "vm",
+               "limit": 50, "offset": 0, "after": ("2024-01-01", "10:00:00", 5), "after_id": 100}
+
+# Métodos que devolvem tabelas inteiras e podem percorrê-las
+LISTINGS = ("get_all_", "get_dashboard")
+
+
+class PlanRecorder(EmailAPI):
+    """EmailAPI que guarda o plano de cada consulta em vez de executá-la"""
+
+    def __init__(self, db_name: str):
+        super().__init__(db_name)
+        self.plans = []
+
+    def _execute_query(self, query, params=(), fetch_all=True):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            rows = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+        finally:
+            conn.close()
+        self.plans.append([row[-1] for row in rows])
+        return []
+
+
+def problems(method_name: str, plan, tables) -> list:
+    """Passos do plano que leem uma tabela inteira sem necessidade ou ordenam fora de um índice.
+
+    Varrer uma subconsulta/CTE (já limitada) ou consultar o índice FTS com
+    MATCH (``VIRTUAL TABLE INDEX ...:M``) não conta como varredura.
+    """
+    listing = method_name.startswith(LISTINGS)
+    found = []
+    for step in plan:
+        if "USE TEMP B-TREE" in step:
+            found.append(step)
+        elif step.startswith("SCAN") and not listing and step.split()[1] in tables:
+            if not ("VIRTUAL TABLE INDEX" in step and ":M" in step):
+                found.append(step)
+    return found
+
+
+def check(db_path: str) -> int:
+    DatabaseManager(db_path)
+    api = PlanRecorder(db_path)
+    conn = sqlite3.connect(db_path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    failures = 0
+    for name, method in inspect.getmembers(api, inspect.ismethod):
+        if not name.startswith(("get_", "search")):
+            continue
+        params = inspect.signature(method).parameters
+        api.plans = []
+        try:
+            method(*(SAMPLE_ARGS[p] for p in params))
+        except Exception as e:
+            # email_data e config_catalogs não são criadas por este projeto; as consultas
+            # anteriores do método ainda são verificadas
+            print(f"⚠️ {name}: interrompido ({e})")
+        for plan in api.plans:
+            found = problems(name, plan, tables)
+            status = "❌" if found else "✅"
+            print(f"{status} {name}: {' | '.join(plan)}")
+            failures += bool(found)
+    return failures
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = check(os.path.join(tmp, "plans.db"))
+    print(f"{'❌' if failures else '✅'} {failures} consultas com varredura completa")
+    sys.exit(1 if failures else 0)
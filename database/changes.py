@@ -0,0 +1,123 @@
+"""Contador de alterações do banco, base dos ETag/Last-Modified e do cache da API.
+
+Toda transação que altera dados soma 1 em change_version e grava o horário
+(DatabaseManager faz isso no commit; a retenção, a cada lote). A API lê o
+contador com ChangeWatcher, que só volta à tabela quando o PRAGMA
+data_version indica que outra conexão fez commit — uma requisição
+condicional sem novidades não consulta nenhuma tabela.
+
+Gravações de fora do projeto (ex.: quem alimenta email_data ou
+config_catalogs) não somam no contador; ChangeWatcher as percebe pelo
+data_version que mudou sem a versão mudar e conta cada uma em ``generation``.
+
+Depois do commit, quem gravou avisa os ouvintes deste processo (add_listener)
+com as tabelas alteradas e a nova versão, para invalidar só o que mudou.
+"""
+import sqlite3
+import threading
+from typing import Callable, List, NamedTuple, Optional, Set
+
+from database.connection import connect
+
+# Ouvintes de notify(tables, version) neste processo (ex.: o cache de respostas da API)
+_listeners: List[Callable[[Set[str], int], None]] = []
+_WRITE_ACTIONS = {sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE}
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO change_version (id, version, updated_at)
+        VALUES (1, 1, CAST(strftime('%s', 'now') AS INTEGER))
+        ON CONFLICT (id) DO NOTHING
+    ''')
+
+
+def bump(conn: sqlite3.Connection) -> int:
+    """Registra uma alteração; chamar dentro da transação que altera os dados. Retorna a nova versão"""
+    conn.execute('''
+        UPDATE change_version SET version = version + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+        WHERE id = 1
+    ''')
+    return conn.execute('SELECT version FROM change_version WHERE id = 1').fetchone()[0]
+
+
+def track_writes(conn: sqlite3.Connection) -> Set[str]:
+    """Conjunto (preenchido ao longo do uso da conexão) das tabelas em que ela grava.
+
+    Usa o authorizer do SQLite, chamado ao preparar cada statement, então
+    inclui as tabelas alteradas pelas triggers (ex.: search_index).
+    """
+    written = set()
+
+    def authorizer(action, table, *_):
+        if action in _WRITE_ACTIONS:
+            written.add(table)
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorizer)
+    return written
+
+
+def add_listener(callback: Callable[[Set[str], int], None]):
+    _listeners.append(callback)
+
+
+def notify(tables: Set[str], version: int):
+    """Avisa os ouvintes, depois do commit, das tabelas alteradas até ``version``"""
+    for callback in _listeners:
+        try:
+            callback(set(tables), version)
+        except Exception as e:
+            print(f"⚠️ Erro ao notificar alteração do banco: {e}")
+
+
+class DataVersion(NamedTuple):
+    version: int       # change_version.version
+    updated_at: int    # change_version.updated_at (epoch)
+    generation: int    # commits sem soma no contador vistos por este processo (gravações de fora)
+    seen: int          # commits de qualquer conexão vistos por este processo
+
+
+class ChangeWatcher:
+    """Versão atual do banco (DataVersion), com change_version relido só depois de um commit de outra conexão"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._data_version = None
+        self._current = None
+
+    def current(self) -> Optional[DataVersion]:
+        """None se o banco ainda não tem o contador (ou não pôde ser aberto)"""
+        with self._lock:
+            try:
+                if self._conn is None:
+                    self._conn = connect(self.db_path, read_only=True)
+                data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version != self._data_version or self._current is None:
+                    row = self._conn.execute('SELECT version, updated_at FROM change_version WHERE id = 1').fetchone()
+                    self._data_version = data_version
+                    self._current = self._advance(row[0], row[1]) if row else None
+                return self._current
+            except sqlite3.Error:
+                if self._conn is not None:
+                    self._conn.close()
+                # data_version só se compara dentro da mesma conexão
+                self._conn = self._data_version = None
+                return None
+
+    def _advance(self, version: int, updated_at: int) -> DataVersion:
+        previous = self._current
+        if previous is None:
+            return DataVersion(version, updated_at, 0, 0)
+        # Commit que não mexeu em change_version: gravação de fora, sem como saber o que mudou
+        unknown = version == previous.version
+        return DataVersion(version, updated_at, previous.generation + unknown, previous.seen + 1)
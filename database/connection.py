@@ -0,0 +1,67 @@
+import queue
+import sqlite3
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+# Ajustes por conexão (journal_mode=WAL é persistente e é gravado no arquivo
+# por DatabaseManager): em WAL, synchronous=NORMAL só sincroniza nos checkpoints
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",      # 16 MB de cache de páginas
+    "PRAGMA mmap_size = 268435456",    # leitura do arquivo via mmap, até 256 MB
+    "PRAGMA busy_timeout = 5000",
+)
+STATEMENT_CACHE_SIZE = 256
+READ_POOL_SIZE = 8
+
+
+def connect(db_path: str, read_only: bool = False) -> sqlite3.Connection:
+    """Abre uma conexão com os pragmas do projeto; ``read_only`` abre o arquivo em mode=ro"""
+    if read_only:
+        conn = sqlite3.connect(f"file:{pathname2url(db_path)}?mode=ro", uri=True,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ReadPool:
+    """Conexões somente leitura reaproveitadas entre requisições.
+
+    O servidor do Flask atende cada requisição em uma thread nova, então as
+    conexões ficam em uma fila compartilhada em vez de presas à thread. Cada
+    conexão mantém o cache de statements preparados; com o banco em WAL as
+    leituras não esperam pela thread que grava os e-mails.
+    """
+
+    def __init__(self, db_path: str, size: int = READ_POOL_SIZE):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = connect(self.db_path, read_only=True)
+            conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        except Exception:
+            # A conexão pode ter ficado em estado inválido; não volta para a fila
+            conn.close()
+            raise
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -1,161 +1,276 @@
-import sqlite3
 import os
-from typing import List, Dict, Optional, Tuple
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Set, Tuple
+
+from database import changes, retention, rollups
+from database.connection import connect
+from database.migrations import migrate
+from utils.units import (duration_to_seconds, local_to_epoch, ratio_to_float, report_time_to_epoch,
+                         size_to_bytes)
+
+# Um lock de escrita por arquivo, compartilhado por todos os DatabaseManager do processo
+# (ex.: um por fonte no coordenador): as transações entram em fila aqui em vez de
+# disputar o lock do SQLite até estourar o busy_timeout
+_write_locks: Dict[str, threading.Lock] = {}
+_write_locks_guard = threading.Lock()
+
+
+def _write_lock(db_name: str) -> threading.Lock:
+    with _write_locks_guard:
+        return _write_locks.setdefault(os.path.realpath(db_name), threading.Lock())
+
 
 class DatabaseManager:
     def __init__(self, db_name: str = "veeam_emails.db"):
         # Garante que o banco será criado dentro da pasta database
         base_dir = os.path.dirname(os.path.abspath(__file__))
         self.db_name = os.path.join(base_dir, db_name)
+        # Conexão da transação em andamento (ver transaction), por thread
+        self._local = threading.local()
+        self._write_lock = _write_lock(self.db_name)
         self._init_db()
 
+    @contextmanager
+    def transaction(self):
+        """Agrupa todas as gravações do bloco em uma única conexão e um único commit.
+
+        Cada store_* dentro do bloco vira um SAVEPOINT: um registro que viola
+        uma restrição (IntegrityError) desfaz só aquela gravação. Qualquer
+        outro erro (ex.: ``database is locked``) propaga e desfaz o bloco
+        inteiro, inclusive o watermark, para que o lote seja refeito em vez de
+        o e-mail ser tratado como já existente. Transações aninhadas
+        participam da transação externa.
+
+        As transações de um mesmo arquivo, neste processo, rodam uma de cada
+        vez; o bloco deve conter só as gravações (parsing e I/O antes dele).
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield self._local.conn
+            return
+        with self._write_lock:
+            conn = connect(self.db_name)
+            written = changes.track_writes(conn)
+            version = None
+            self._local.conn = conn
+            try:
+                with conn:
+                    # BEGIN explícito: sem ele o RELEASE do SAVEPOINT externo faria commit
+                    conn.execute("BEGIN")
+                    yield conn
+                    if conn.total_changes:
+                        version = changes.bump(conn)
+            finally:
+                self._local.conn = None
+                conn.close()
+        if version is not None:
+            changes.notify(written, version)
+
+    def _must_propagate(self, error: Exception) -> bool:
+        """Erros de gravação dentro de transaction() que não são de integridade precisam desfazer o lote"""
+        return getattr(self._local, "conn", None) is not None and not isinstance(error, sqlite3.IntegrityError)
+
+    @contextmanager
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_name)
+            written = changes.track_writes(conn)
+            version = None
+            try:
+                with conn:
+                    yield conn
+                    # Só conta como alteração se o bloco gravou algo (leituras não mudam o ETag)
+                    if conn.total_changes:
+                        version = changes.bump(conn)
+            finally:
+                conn.close()
+            if version is not None:
+                changes.notify(written, version)
+            return
+        conn.execute("SAVEPOINT store")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK TO store")
+            raise
+        finally:
+            conn.execute("RELEASE store")
+
     def _init_db(self):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            # ...criação das tabelas conforme o código original...
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS emails (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    subject TEXT,
-                    date TEXT,
-                    sent_time TEXT,
-                    processed_date TEXT DEFAULT CURRENT_TIMESTAMP,
-                    is_processed INTEGER DEFAULT 0
-                )
-            ''')
-            cursor.execute("PRAGMA table_info(emails)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'sent_time' not in columns:
-                cursor.execute('ALTER TABLE emails ADD COLUMN sent_time TEXT')
-                print("✅ Coluna sent_time adicionada à tabela emails")
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS backup_jobs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email_id INTEGER,
-                    job_name TEXT,
-                    created_by TEXT,
-                    created_at TEXT,
-                    summary_success TEXT,
-                    summary_warning TEXT,
-                    summary_error TEXT,
-                    start_time TEXT,
-                    end_time TEXT,
-                    duration TEXT,
-                    total_size TEXT,
-                    backup_size TEXT,
-                    data_read TEXT,
-                    dedupe TEXT,
-                    transferred TEXT,
-                    compression TEXT,
-                    processed_vms TEXT,
-                    processed_vms_total TEXT,
-                    processed_vms_success TEXT,
-                    processed_vms_warning TEXT,
-                    processed_vms_error TEXT,
-                    FOREIGN KEY (email_id) REFERENCES emails (id)
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS backup_vms (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    job_id INTEGER,
-                    name TEXT,
-                    status TEXT,
-                    start_time TEXT,
-                    end_time TEXT,
-                    size TEXT,
-                    read TEXT,
-                    transferred TEXT,
-                    duration TEXT,
-                    details TEXT,
-                    FOREIGN KEY (job_id) REFERENCES backup_jobs (id)
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS config_backups (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email_id INTEGER,
-                    server TEXT,
-                    repository TEXT,
-                    status TEXT,
-                    catalogs_processed INTEGER,
-                    backup_date TEXT,
-                    start_time TEXT,
-                    end_time TEXT,
-                    data_size TEXT,
-                    backup_size TEXT,
-                    duration TEXT,
-                    compression TEXT,
-                    warnings TEXT,
-                    FOREIGN KEY (email_id) REFERENCES emails (id)
-                )
-            ''')
-            conn.commit()
+        conn = connect(self.db_name)
+        try:
+            # Só vale para arquivos novos; bancos existentes: python -m database.retention --full-vacuum
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL fica gravado no arquivo: as leituras da API não bloqueiam as gravações
+            conn.execute("PRAGMA journal_mode = WAL")
+            migrate(conn)
+        finally:
+            conn.close()
+
+    def get_watermark(self, mailbox: str) -> Optional[Tuple[int, int]]:
+        """Retorna (uidvalidity, last_uid) da última sincronização da caixa"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT uidvalidity, last_uid FROM imap_watermarks WHERE mailbox = ?', (mailbox,)
+            ).fetchone()
+            return (row[0], row[1]) if row else None
 
-    def store_email(self, subject: str, date: str, sent_time: str) -> Optional[int]:
+    def update_watermark(self, mailbox: str, uidvalidity: int, last_uid: int):
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id FROM emails 
-                    WHERE subject = ? AND date = ? AND sent_time = ?
-                ''', (subject, date, sent_time))
-                if cursor.fetchone():
-                    return None
-                cursor.execute('''
-                    INSERT INTO emails (subject, date, sent_time)
-                    VALUES (?, ?, ?)
-                ''', (subject, date, sent_time))
-                email_id = cursor.lastrowid
-                conn.commit()
-                return email_id
+            with self._connect() as conn:
+                conn.execute('''
+                    INSERT INTO imap_watermarks (mailbox, uidvalidity, last_uid, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(mailbox) DO UPDATE SET
+                        uidvalidity = excluded.uidvalidity,
+                        last_uid = excluded.last_uid,
+                        updated_at = excluded.updated_at
+                ''', (mailbox, uidvalidity, last_uid))
+        except Exception as e:
+            if self._must_propagate(e):
+                raise
+            print(f"❌ Erro ao atualizar watermark: {e}")
+
+    def get_known_message_ids(self, message_ids) -> Set[str]:
+        """Retorna, dentre os Message-IDs informados, os que já estão na tabela emails"""
+        message_ids = list(message_ids)
+        known = set()
+        with self._connect() as conn:
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f'SELECT message_id FROM emails WHERE message_id IN ({placeholders})', chunk
+                ).fetchall()
+                known.update(row[0] for row in rows)
+        return known
+
+    def store_email(self, subject: str, date: str, sent_time: str, message_id: Optional[str] = None,
+                    raw_key: Optional[str] = None, sent_at: Optional[int] = None) -> Optional[int]:
+        """Insere o e-mail; retorna None se já existe (mesmo Message-ID ou mesmo subject, date e sent_time).
+
+        ``sent_at`` é o epoch UTC do envio; sem ele, date/sent_time são
+        interpretados no fuso do servidor.
+        """
+        if sent_at is None:
+            sent_at = local_to_epoch(date, sent_time)
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute('''
+                    INSERT INTO emails (subject, date, sent_time, message_id, raw_key, sent_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT DO NOTHING
+                ''', (subject, date, sent_time, message_id, raw_key, sent_at))
+                return cursor.lastrowid if cursor.rowcount else None
         except Exception as e:
+            if self._must_propagate(e):
+                raise
             print(f"❌ Erro ao armazenar e-mail: {e}")
             return None
 
     def get_processed_emails(self) -> List[Tuple]:
-        with sqlite3.connect(self.db_name) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT id, subject, date, sent_time 
                 FROM emails 
                 WHERE is_processed = 1
-                ORDER BY date DESC, sent_time DESC
+                ORDER BY COALESCE(date, '') DESC, COALESCE(sent_time, '') DESC, id DESC
             ''')
             return cursor.fetchall()
 
-    def mark_email_processed(self, email_id: int):
+    def get_archived_emails(self, older_than_version: Optional[int] = None,
+                            kind: Optional[str] = None) -> List[Tuple[int, str]]:
+        """Retorna (id, raw_key) dos e-mails cuja mensagem bruta está no arquivo local.
+
+        ``older_than_version`` restringe aos e-mails parseados por uma versão
+        anterior do parser (ou sem versão); ``kind`` restringe a um tipo de
+        relatório, incluindo os e-mails de tipo ainda desconhecido.
+        """
+        query = 'SELECT id, raw_key FROM emails WHERE raw_key IS NOT NULL'
+        params = []
+        if older_than_version is not None:
+            query += ' AND (parser_version IS NULL OR parser_version < ?)'
+            params.append(older_than_version)
+        if kind is not None:
+            query += ' AND (report_kind IS NULL OR report_kind = ?)'
+            params.append(kind)
+        with self._connect() as conn:
+            return conn.execute(query + ' ORDER BY id', params).fetchall()
+
+    def clear_derived(self, email_id: int):
+        """Apaga jobs, VMs e config backups extraídos de um e-mail (para reparse)"""
+        with self._connect() as conn:
+            rollups.apply(conn, rollups.JOB_SOURCE, "j.email_id = :p0", (email_id,), sign=-1)
+            rollups.apply(conn, rollups.CONFIG_SOURCE, "c.email_id = :p0", (email_id,), sign=-1)
+            conn.execute(
+                'DELETE FROM backup_vms WHERE job_id IN (SELECT id FROM backup_jobs WHERE email_id = ?)',
+                (email_id,)
+            )
+            conn.execute('DELETE FROM backup_jobs WHERE email_id = ?', (email_id,))
+            conn.execute('DELETE FROM config_backups WHERE email_id = ?', (email_id,))
+
+    def store_report(self, email_id: int, parsed: Dict, parser_version: Optional[int] = None):
+        """Grava tudo o que foi extraído de um e-mail (resultado de parse_report) em uma transação.
+
+        Config backup ou jobs com suas VMs, e por fim a marcação do e-mail com
+        a versão do parser. Dentro de um ``transaction()`` externo (ex.: um
+        lote inteiro) participa dele em vez de abrir outro.
+        """
+        with self.transaction():
+            if "config" in parsed:
+                if parsed["config"]:
+                    self.store_config_backup(email_id, parsed["config"])
+            else:
+                for job_info, vm_list in parsed["jobs"]:
+                    job_id = self.store_job(email_id, job_info)
+                    if job_id and vm_list:
+                        self.store_vm_details(job_id, vm_list)
+            self.mark_email_processed(email_id, parser_version, parsed.get("kind"))
+
+    def rebuild_rollups(self):
+        """Recalcula daily_summary e daily_job_summary a partir de todo o histórico"""
+        with self._connect() as conn:
+            rollups.rebuild(conn)
+
+    def apply_retention(self, days: int, archive_name: Optional[str] = None) -> Dict[str, int]:
+        """Compacta as VMs com mais de ``days`` dias (ver database.retention); ``archive_name`` fica em database/"""
+        archive_path = os.path.join(os.path.dirname(self.db_name), archive_name) if archive_name else None
+        return retention.compact(self.db_name, days, archive_path)
+
+    def mark_email_processed(self, email_id: int, parser_version: Optional[int] = None,
+                             report_kind: Optional[str] = None):
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                conn.execute('UPDATE emails SET is_processed = 1 WHERE id = ?', (email_id,))
-                conn.commit()
+            with self._connect() as conn:
+                conn.execute('''
+                    UPDATE emails SET is_processed = 1, parser_version = ?, report_kind = ?
+                    WHERE id = ?
+                ''', (parser_version, report_kind, email_id))
         except Exception as e:
+            if self._must_propagate(e):
+                raise
             print(f"❌ Erro ao marcar e-mail: {e}")
 
     def store_job(self, email_id: int, job: dict) -> Optional[int]:
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
-                # Verifica se já existe um job igual para o mesmo email, nome, start_time, end_time, created_by e created_at
-                cursor.execute('''
-                    SELECT id FROM backup_jobs
-                    WHERE email_id = ? AND job_name = ? AND start_time = ? AND end_time = ? AND created_by = ? AND created_at = ?
-                ''', (
-                    email_id,
-                    job.get('job_name'),
-                    job.get('start_time'),
-                    job.get('end_time'),
-                    job.get('created_by'),
-                    job.get('created_at')
-                ))
-                if cursor.fetchone():
-                    return None
+                # Data/hora do envio, referência para os horários do relatório
+                sent = conn.execute(
+                    'SELECT date, sent_time, sent_at FROM emails WHERE id = ?', (email_id,)
+                ).fetchone() or (None, None, None)
+                # Job repetido (mesma chave de ux_backup_jobs_natural_key) é ignorado, junto com suas VMs
                 cursor.execute('''
                     INSERT INTO backup_jobs (
                         email_id, job_name, created_by, created_at, summary_success, summary_warning, summary_error,
                         start_time, end_time, duration, total_size, backup_size, data_read, dedupe, transferred, compression,
-                        processed_vms, processed_vms_total, processed_vms_success, processed_vms_warning, processed_vms_error
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        processed_vms, processed_vms_total, processed_vms_success, processed_vms_warning, processed_vms_error,
+                        total_size_bytes, backup_size_bytes, data_read_bytes, transferred_bytes, duration_seconds,
+                        dedupe_ratio, compression_ratio, started_at, ended_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT DO NOTHING
                 ''', (
                     email_id,
                     job.get('job_name'),
@@ -177,76 +292,78 @@ class DatabaseManager:
                     job.get('processed_vms_total'),
                     job.get('summary_success'),
                     job.get('summary_warning'),
-                    job.get('summary_error')
+                    job.get('summary_error'),
+                    size_to_bytes(job.get('total_size')),
+                    size_to_bytes(job.get('backup_size')),
+                    size_to_bytes(job.get('data_read')),
+                    size_to_bytes(job.get('transferred')),
+                    duration_to_seconds(job.get('duration')),
+                    ratio_to_float(job.get('dedupe')),
+                    ratio_to_float(job.get('compression')),
+                    report_time_to_epoch(job.get('start_time'), *sent),
+                    report_time_to_epoch(job.get('end_time'), *sent)
                 ))
+                if not cursor.rowcount:
+                    return None
                 job_id = cursor.lastrowid
-                conn.commit()
+                rollups.apply(conn, rollups.JOB_SOURCE, "j.id = :p0", (job_id,))
                 return job_id
         except Exception as e:
+            if self._must_propagate(e):
+                raise
             print(f"❌ Erro ao armazenar job: {e}")
             return None
 
     def store_vm_details(self, job_id: int, vms: list):
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                for vm in vms:
-                    # Verifica se já existe VM igual para o mesmo job_id, nome, start_time, end_time e status
-                    cursor.execute('''
-                        SELECT id FROM backup_vms
-                        WHERE job_id = ? AND name = ? AND start_time = ? AND end_time = ? AND status = ?
-                    ''', (
-                        job_id,
-                        vm.get('name'),
-                        vm.get('start_time'),
-                        vm.get('end_time'),
-                        vm.get('status')
-                    ))
-                    if cursor.fetchone():
-                        continue
-                    cursor.execute('''
-                        INSERT INTO backup_vms (
-                            job_id, name, status, start_time, end_time, size, read, transferred, duration, details
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        job_id,
-                        vm.get('name'),
-                        vm.get('status'),
-                        vm.get('start_time'),
-                        vm.get('end_time'),
-                        vm.get('size'),
-                        vm.get('read'),
-                        vm.get('transferred'),
-                        vm.get('duration'),
-                        vm.get('details')
-                    ))
-                conn.commit()
+            with self._connect() as conn:
+                sent = conn.execute('''
+                    SELECT e.date, e.sent_time, e.sent_at
+                    FROM backup_jobs j JOIN emails e ON e.id = j.email_id
+                    WHERE j.id = ?
+                ''', (job_id,)).fetchone() or (None, None, None)
+                rows = [(
+                    job_id,
+                    vm.get('name'),
+                    vm.get('status'),
+                    vm.get('start_time'),
+                    vm.get('end_time'),
+                    vm.get('size'),
+                    vm.get('read'),
+                    vm.get('transferred'),
+                    vm.get('duration'),
+                    vm.get('details'),
+                    size_to_bytes(vm.get('size')),
+                    size_to_bytes(vm.get('read')),
+                    size_to_bytes(vm.get('transferred')),
+                    duration_to_seconds(vm.get('duration')),
+                    report_time_to_epoch(vm.get('start_time'), *sent),
+                    report_time_to_epoch(vm.get('end_time'), *sent)
+                ) for vm in vms]
+                # VMs repetidas (mesmo job, nome, start_time, end_time e status) são ignoradas
+                conn.executemany('''
+                    INSERT INTO backup_vms (
+                        job_id, name, status, start_time, end_time, size, read, transferred, duration, details,
+                        size_bytes, read_bytes, transferred_bytes, duration_seconds, started_at, ended_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT DO NOTHING
+                ''', rows)
         except Exception as e:
+            if self._must_propagate(e):
+                raise
             print(f"❌ Erro ao armazenar detalhes da VM: {e}")
 
     def store_config_backup(self, email_id: int, info: dict) -> Optional[int]:
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
-                # Verifica se já existe um config igual para o mesmo email, server, repository, backup_date, start_time e status
-                cursor.execute('''
-                    SELECT id FROM config_backups
-                    WHERE email_id = ? AND server = ? AND repository = ? AND backup_date = ? AND start_time = ? AND status = ?
-                ''', (
-                    email_id,
-                    info.get("server"),
-                    info.get("repository"),
-                    info.get("backup_date"),
-                    info.get("start_time"),
-                    info.get("status")
-                ))
-                if cursor.fetchone():
-                    return None
                 cursor.execute('''
                     INSERT INTO config_backups (
                         email_id, server, repository, status, catalogs_processed, backup_date,
-                        start_time, end_time, data_size, backup_size, duration, compression, warnings
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        start_time, end_time, data_size, backup_size, duration, compression, warnings,
+                        data_size_bytes, backup_size_bytes, duration_seconds, compression_ratio
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT DO NOTHING
                 ''', (
                     email_id,
                     info.get("server"),
@@ -260,11 +377,19 @@ class DatabaseManager:
                     info.get("backup_size"),
                     info.get("duration"),
                     info.get("compression"),
-                    info.get("warnings")
+                    info.get("warnings"),
+                    size_to_bytes(info.get("data_size")),
+                    size_to_bytes(info.get("backup_size")),
+                    duration_to_seconds(info.get("duration")),
+                    ratio_to_float(info.get("compression"))
                 ))
+                if not cursor.rowcount:
+                    return None
                 config_id = cursor.lastrowid
-                conn.commit()
+                rollups.apply(conn, rollups.CONFIG_SOURCE, "c.id = :p0", (config_id,))
                 return config_id
         except Exception as e:
+            if self._must_propagate(e):
+                raise
             print(f"❌ Erro ao armazenar config backup: {e}")
             return None
@@ -0,0 +1,373 @@
+"""Migrações versionadas do banco SQLite.
+
+Cada migração é uma função que recebe um cursor e altera o schema; elas rodam
+em ordem, uma transação por migração, e a versão aplicada fica registrada em
+``schema_version``. Para mudar o schema, acrescente uma função ao fim de
+MIGRATIONS — nunca altere uma migração que já foi publicada.
+"""
+import sqlite3
+from typing import Callable, List, Tuple
+
+from database import changes, retention, rollups
+from utils.units import (duration_to_seconds, local_to_epoch, ratio_to_float, report_time_to_epoch,
+                         size_to_bytes)
+
+# (índice, tabela, colunas) das chaves naturais, na ordem em que os duplicados são
+# resolvidos: pais antes dos filhos, para que os filhos repontados sejam deduplicados
+NATURAL_KEYS = [
+    ("ux_emails_natural_key", "emails", ("subject", "date", "sent_time")),
+    ("ux_emails_message_id", "emails", ("message_id",)),
+    ("ux_backup_jobs_natural_key", "backup_jobs",
+     ("email_id", "job_name", "start_time", "end_time", "created_by", "created_at")),
+    ("ux_backup_vms_natural_key", "backup_vms", ("job_id", "name", "start_time", "end_time", "status")),
+    ("ux_config_backups_natural_key", "config_backups",
+     ("email_id", "server", "repository", "backup_date", "start_time", "status")),
+]
+
+
+def _add_missing_columns(cursor, table: str, columns: List[Tuple[str, str]]):
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {column[1] for column in cursor.fetchall()}
+    for name, kind in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {kind}')
+            print(f"✅ Coluna {name} adicionada à tabela {table}")
+
+
+def base_schema(cursor):
+    """Tabelas originais; bancos anteriores ao controle de versão ganham as colunas que faltam"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS emails (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT,
+            date TEXT,
+            sent_time TEXT,
+            processed_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            is_processed INTEGER DEFAULT 0,
+            message_id TEXT,
+            raw_key TEXT,
+            parser_version INTEGER,
+            report_kind TEXT
+        )
+    ''')
+    _add_missing_columns(cursor, "emails", [
+        ("sent_time", "TEXT"),
+        ("message_id", "TEXT"),
+        ("raw_key", "TEXT"),
+        ("parser_version", "INTEGER"),
+        ("report_kind", "TEXT"),
+    ])
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backup_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_id INTEGER,
+            job_name TEXT,
+            created_by TEXT,
+            created_at TEXT,
+            summary_success TEXT,
+            summary_warning TEXT,
+            summary_error TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            duration TEXT,
+            total_size TEXT,
+            backup_size TEXT,
+            data_read TEXT,
+            dedupe TEXT,
+            transferred TEXT,
+            compression TEXT,
+            processed_vms TEXT,
+            processed_vms_total TEXT,
+            processed_vms_success TEXT,
+            processed_vms_warning TEXT,
+            processed_vms_error TEXT,
+            FOREIGN KEY (email_id) REFERENCES emails (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backup_vms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER,
+            name TEXT,
+            status TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            size TEXT,
+            read TEXT,
+            transferred TEXT,
+            duration TEXT,
+            details TEXT,
+            FOREIGN KEY (job_id) REFERENCES backup_jobs (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS config_backups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_id INTEGER,
+            server TEXT,
+            repository TEXT,
+            status TEXT,
+            catalogs_processed INTEGER,
+            backup_date TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            data_size TEXT,
+            backup_size TEXT,
+            duration TEXT,
+            compression TEXT,
+            warnings TEXT,
+            FOREIGN KEY (email_id) REFERENCES emails (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS imap_watermarks (
+            mailbox TEXT PRIMARY KEY,
+            uidvalidity INTEGER,
+            last_uid INTEGER DEFAULT 0,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def natural_keys(cursor):
+    """Chaves únicas das tabelas; antes, mantém o menor id de cada chave e aponta os filhos para ele.
+
+    Diferente do antigo DuplicateRemover, não deixa jobs e VMs órfãos: os
+    filhos dos registros removidos passam para o registro mantido e, se
+    ficarem repetidos, são removidos na etapa seguinte.
+    """
+    children = {"emails": [("backup_jobs", "email_id"), ("config_backups", "email_id")],
+                "backup_jobs": [("backup_vms", "job_id")]}
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS dup_map (old_id INTEGER PRIMARY KEY, new_id INTEGER)')
+    for _, table, columns in NATURAL_KEYS:
+        keys = ", ".join(columns)
+        cursor.execute('DELETE FROM dup_map')
+        cursor.execute(f'''
+            INSERT INTO dup_map (old_id, new_id)
+            SELECT id, keep_id FROM (
+                SELECT id, MIN(id) OVER (PARTITION BY {keys}) AS keep_id
+                FROM {table} WHERE {" AND ".join(f"{c} IS NOT NULL" for c in columns)}
+            ) WHERE id <> keep_id
+        ''')
+        for child, fk in children.get(table, []):
+            cursor.execute(f'''
+                UPDATE {child} SET {fk} = (SELECT new_id FROM dup_map WHERE old_id = {child}.{fk})
+                WHERE {fk} IN (SELECT old_id FROM dup_map)
+            ''')
+        cursor.execute(f'DELETE FROM {table} WHERE id IN (SELECT old_id FROM dup_map)')
+        if cursor.rowcount:
+            print(f"🧹 {cursor.rowcount} registros duplicados removidos de {table}")
+    cursor.execute('DROP TABLE dup_map')
+    cursor.execute('DROP INDEX IF EXISTS idx_emails_message_id')
+    for name, table, columns in NATURAL_KEYS:
+        where = ' WHERE message_id IS NOT NULL' if columns == ('message_id',) else ''
+        cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)}){where}')
+
+
+def query_indexes(cursor):
+    """Índices dos caminhos de consulta da API (ver backup/check_query_plans.py).
+
+    As buscas por email_id e job_id já usam as chaves únicas, que começam
+    por essas colunas.
+    """
+    # Listagem e busca por data dos e-mails, cobrindo as colunas retornadas pela API
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_emails_date_sent_time
+        ON emails (date, sent_time, subject, processed_date, is_processed)
+    ''')
+    # Jobs com erro, no geral e por e-mail
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_backup_jobs_summary_error ON backup_jobs (summary_error, email_id)')
+
+
+# (coluna texto, coluna numérica, tipo, conversão) por tabela
+NUMERIC_COLUMNS = {
+    "backup_jobs": [
+        ("total_size", "total_size_bytes", "INTEGER", size_to_bytes),
+        ("backup_size", "backup_size_bytes", "INTEGER", size_to_bytes),
+        ("data_read", "data_read_bytes", "INTEGER", size_to_bytes),
+        ("transferred", "transferred_bytes", "INTEGER", size_to_bytes),
+        ("duration", "duration_seconds", "INTEGER", duration_to_seconds),
+        ("dedupe", "dedupe_ratio", "REAL", ratio_to_float),
+        ("compression", "compression_ratio", "REAL", ratio_to_float),
+    ],
+    "backup_vms": [
+        ("size", "size_bytes", "INTEGER", size_to_bytes),
+        ("read", "read_bytes", "INTEGER", size_to_bytes),
+        ("transferred", "transferred_bytes", "INTEGER", size_to_bytes),
+        ("duration", "duration_seconds", "INTEGER", duration_to_seconds),
+    ],
+    "config_backups": [
+        ("data_size", "data_size_bytes", "INTEGER", size_to_bytes),
+        ("backup_size", "backup_size_bytes", "INTEGER", size_to_bytes),
+        ("duration", "duration_seconds", "INTEGER", duration_to_seconds),
+        ("compression", "compression_ratio", "REAL", ratio_to_float),
+    ],
+}
+
+
+def numeric_columns(cursor):
+    """Tamanhos em bytes, durações em segundos e taxas como REAL, preenchidos a partir dos textos"""
+    conn = cursor.connection
+    for name, func in (("size_to_bytes", size_to_bytes), ("duration_to_seconds", duration_to_seconds),
+                       ("ratio_to_float", ratio_to_float)):
+        conn.create_function(name, 1, func, deterministic=True)
+    for table, columns in NUMERIC_COLUMNS.items():
+        _add_missing_columns(cursor, table, [(target, kind) for _, target, kind, _ in columns])
+        assignments = ", ".join(f"{target} = {func.__name__}({source})" for source, target, _, func in columns)
+        cursor.execute(f'UPDATE {table} SET {assignments}')
+    # Ordenação e top-N por tamanho sem varrer as tabelas
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_backup_jobs_backup_size_bytes ON backup_jobs (backup_size_bytes)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_backup_vms_size_bytes ON backup_vms (size_bytes)')
+
+
+def timestamps(cursor):
+    """Epoch UTC indexado do envio do e-mail e do início/fim de jobs e VMs, para consultas por período.
+
+    Os e-mails antigos não guardaram o fuso do cabeçalho Date, então seu
+    sent_at é calculado no fuso do servidor; os novos usam o fuso do e-mail.
+    """
+    conn = cursor.connection
+    conn.create_function("local_to_epoch", 2, local_to_epoch, deterministic=True)
+    conn.create_function("report_time_to_epoch", 4, report_time_to_epoch, deterministic=True)
+    _add_missing_columns(cursor, "emails", [("sent_at", "INTEGER")])
+    _add_missing_columns(cursor, "backup_jobs", [("started_at", "INTEGER"), ("ended_at", "INTEGER")])
+    _add_missing_columns(cursor, "backup_vms", [("started_at", "INTEGER"), ("ended_at", "INTEGER")])
+    cursor.execute('UPDATE emails SET sent_at = local_to_epoch(date, sent_time)')
+    for table, email_join in (
+        ("backup_jobs", "emails e WHERE e.id = backup_jobs.email_id"),
+        ("backup_vms", "backup_jobs j JOIN emails e ON e.id = j.email_id WHERE j.id = backup_vms.job_id"),
+    ):
+        for source, target in (("start_time", "started_at"), ("end_time", "ended_at")):
+            cursor.execute(f'''
+                UPDATE {table} SET {target} = (
+                    SELECT report_time_to_epoch({table}.{source}, e.date, e.sent_time, e.sent_at)
+                    FROM {email_join}
+                )
+            ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_sent_at ON emails (sent_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_backup_jobs_started_at ON backup_jobs (started_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_backup_vms_started_at ON backup_vms (started_at)')
+
+
+def daily_rollups(cursor):
+    """Resumos diários por job e gerais, preenchidos com o histórico existente"""
+    rollups.create_tables(cursor)
+    rollups.rebuild(cursor.connection)
+
+
+# Tabelas indexadas em search_index: (tabela, coluna de origem, coluna FTS, código no rowid).
+# O rowid da busca é id * 4 + código, para achar e apagar a entrada pelo id de origem.
+SEARCH_SOURCES = (
+    ("backup_vms", "details", "vm_details", 1),
+    ("backup_jobs", "job_name", "job_name", 2),
+    ("config_backups", "warnings", "config_warnings", 3),
+)
+
+
+def full_text_search(cursor):
+    """Índice FTS5 de detalhes de VMs, nomes de jobs e avisos de config backups, mantido por triggers"""
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index
+            USING fts5(vm_details, job_name, config_warnings, tokenize = "unicode61 remove_diacritics 2")
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ Busca textual indisponível, SQLite sem FTS5 ({e})")
+        return
+    columns = ", ".join(column for _, _, column, _ in SEARCH_SOURCES)
+    for table, source, column, code in SEARCH_SOURCES:
+        def insert_from(row: str) -> str:
+            values = ", ".join(f"{row}{source}" if c == column else "NULL" for _, _, c, _ in SEARCH_SOURCES)
+            return (f"INSERT INTO search_index (rowid, {columns}) SELECT {row}id * 4 + {code}, {values}"
+                    f"{' FROM ' + table if not row else ''} WHERE {row}{source} IS NOT NULL AND {row}{source} <> ''")
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code}"
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} '
+                       f'BEGIN {insert_from("new.")}; END')
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} '
+                       f'BEGIN {delete}; END')
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {source} ON {table} '
+                       f'BEGIN {delete}; {insert_from("new.")}; END')
+        # Histórico já gravado
+        cursor.execute(insert_from(""))
+
+
+def vm_retention(cursor):
+    """Resumo mensal das VMs compactadas e a marcação dos e-mails já compactados"""
+    retention.create_tables(cursor)
+    _add_missing_columns(cursor, "emails", [("vms_compacted_at", "INTEGER")])
+
+
+def keyset_indexes(cursor):
+    """Índice de paginação dos e-mails por (date, sent_time, id), cobrindo as colunas da API.
+
+    Substitui idx_emails_date_sent_time, que servia a mesma listagem mas sem o
+    id como desempate (o cursor precisaria de uma ordenação temporária). Jobs,
+    VMs e config backups paginam pelo id, que já é a chave primária.
+    """
+    cursor.execute('DROP INDEX IF EXISTS idx_emails_date_sent_time')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_emails_keyset
+        ON emails (date, sent_time, id, subject, processed_date, is_processed)
+    ''')
+
+
+def keyset_null_dates(cursor):
+    """Recria idx_emails_keyset sobre COALESCE(date, '') e COALESCE(sent_time, '').
+
+    Com as colunas puras, um e-mail com data ou hora nula comparava como NULL
+    com o cursor e ficava fora da paginação; date e sent_time continuam no
+    índice para que ele cubra as colunas da API.
+    """
+    cursor.execute('DROP INDEX IF EXISTS idx_emails_keyset')
+    cursor.execute('''
+        CREATE INDEX idx_emails_keyset
+        ON emails (COALESCE(date, ''), COALESCE(sent_time, ''), id, date, sent_time, subject, processed_date, is_processed)
+    ''')
+
+
+def change_version(cursor):
+    """Contador de alterações usado nos ETag/Last-Modified da API"""
+    changes.create_table(cursor)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "schema inicial", base_schema),
+    (2, "chaves naturais únicas", natural_keys),
+    (3, "índices das consultas da API", query_indexes),
+    (4, "colunas numéricas de tamanho, duração e taxa", numeric_columns),
+    (5, "timestamps UTC de e-mails, jobs e VMs", timestamps),
+    (6, "resumos diários", daily_rollups),
+    (7, "busca textual", full_text_search),
+    (8, "retenção dos detalhes de VMs", vm_retention),
+    (9, "índice de paginação dos e-mails", keyset_indexes),
+    (10, "contador de alterações", change_version),
+    (11, "paginação de e-mails sem data ou hora", keyset_null_dates),
+]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Aplica as migrações pendentes; retorna a versão final do schema"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    current = conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+    applied = False
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        with conn:
+            conn.execute("BEGIN")
+            step(conn.cursor())
+            conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+        print(f"✅ Migração {version} aplicada: {description}")
+        current = version
+        applied = True
+    if applied:
+        # O schema (e o formato das respostas) pode ter mudado: invalida os ETags
+        with conn:
+            changes.bump(conn)
+    return current
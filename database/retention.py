@@ -0,0 +1,198 @@
+"""Retenção dos detalhes de VMs: resumo mensal, arquivo opcional e incremental_vacuum.
+
+Uso (a partir da raiz do projeto):
+    python -m database.retention --days 180 [--archive veeam_archive.db] [--db veeam_emails.db]
+    python -m database.retention --full-vacuum     # uma vez, em bancos criados sem auto_vacuum
+
+As linhas de backup_vms de e-mails enviados há mais de ``--days`` dias são
+somadas em monthly_vm_summary (mês, job e VM) e removidas do banco principal;
+com ``--archive`` elas são antes copiadas para um banco separado, que pode ser
+anexado com ``ATTACH DATABASE 'database/veeam_archive.db' AS archive`` quando
+for preciso consultá-las. Jobs, config backups e os resumos diários ficam,
+assim como as VMs de e-mails sem data (não há mês em que somá-las).
+
+Cada lote de e-mails é uma transação curta e o espaço liberado volta ao disco
+em passos pequenos de incremental_vacuum, para que a ingestão nunca espere muito.
+"""
+import argparse
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from database import changes
+from database.connection import connect
+
+BATCH_SIZE = 200          # e-mails por transação
+VACUUM_STEP_PAGES = 256   # páginas devolvidas por passo de incremental_vacuum (1 MB com páginas de 4 KB)
+# E-mails sem data não têm mês no resumo mensal: ficam fora da compactação e mantêm as VMs,
+# senão elas sairiam do banco sem somar em nenhuma linha do resumo
+COMPACTABLE = "e.date IS NOT NULL"
+
+MONTHLY_VM_SUMMARY = '''
+    CREATE TABLE IF NOT EXISTS monthly_vm_summary (
+        month TEXT NOT NULL,
+        job_name TEXT NOT NULL,
+        vm_name TEXT NOT NULL,
+        runs INTEGER NOT NULL DEFAULT 0,
+        success INTEGER NOT NULL DEFAULT 0,
+        warning INTEGER NOT NULL DEFAULT 0,
+        error INTEGER NOT NULL DEFAULT 0,
+        size_bytes INTEGER NOT NULL DEFAULT 0,
+        read_bytes INTEGER NOT NULL DEFAULT 0,
+        transferred_bytes INTEGER NOT NULL DEFAULT 0,
+        duration_seconds INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (month, job_name, vm_name)
+    ) WITHOUT ROWID
+'''
+
+
+def create_tables(cursor):
+    cursor.execute(MONTHLY_VM_SUMMARY)
+
+
+def _summarize(conn: sqlite3.Connection, email_ids: List[int]):
+    """Soma no resumo mensal as VMs dos e-mails ainda não compactados"""
+    placeholders = ",".join("?" * len(email_ids))
+    conn.execute(f'''
+        INSERT INTO monthly_vm_summary (month, job_name, vm_name, runs, success, warning, error,
+                                        size_bytes, read_bytes, transferred_bytes, duration_seconds)
+        SELECT substr(e.date, 1, 7), COALESCE(j.job_name, ''), COALESCE(v.name, ''), COUNT(*),
+               SUM(lower(v.status) = 'success'), SUM(lower(v.status) = 'warning'),
+               SUM(lower(v.status) IN ('error', 'failed')),
+               COALESCE(SUM(v.size_bytes), 0), COALESCE(SUM(v.read_bytes), 0),
+               COALESCE(SUM(v.transferred_bytes), 0), COALESCE(SUM(v.duration_seconds), 0)
+        FROM emails e
+        JOIN backup_jobs j ON j.email_id = e.id
+        JOIN backup_vms v ON v.job_id = j.id
+        WHERE e.id IN ({placeholders}) AND e.vms_compacted_at IS NULL AND {COMPACTABLE}
+        GROUP BY 1, 2, 3
+        ON CONFLICT (month, job_name, vm_name) DO UPDATE SET
+            runs = runs + excluded.runs,
+            success = success + excluded.success,
+            warning = warning + excluded.warning,
+            error = error + excluded.error,
+            size_bytes = size_bytes + excluded.size_bytes,
+            read_bytes = read_bytes + excluded.read_bytes,
+            transferred_bytes = transferred_bytes + excluded.transferred_bytes,
+            duration_seconds = duration_seconds + excluded.duration_seconds
+    ''', email_ids)
+
+
+def _prepare_archive(conn: sqlite3.Connection) -> List[str]:
+    """Cria (ou completa) archive.backup_vms com as colunas atuais de backup_vms"""
+    columns = [(row[1], row[2]) for row in conn.execute("PRAGMA main.table_info(backup_vms)")]
+    definitions = ", ".join(f"{name} {kind}" + (" PRIMARY KEY" if name == "id" else "") for name, kind in columns)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS archive.backup_vms ({definitions})")
+    existing = {row[1] for row in conn.execute("PRAGMA archive.table_info(backup_vms)")}
+    for name, kind in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE archive.backup_vms ADD COLUMN {name} {kind}")
+    conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_backup_vms_job_id ON backup_vms (job_id)")
+    return [name for name, _ in columns]
+
+
+def incremental_vacuum(conn: sqlite3.Connection, step_pages: int = VACUUM_STEP_PAGES) -> int:
+    """Devolve ao disco as páginas livres, ``step_pages`` por transação; retorna quantas"""
+    freed = 0
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free:
+        # execute() avança o pragma um passo só (uma página); executescript roda até o fim
+        conn.executescript(f"PRAGMA incremental_vacuum({min(free, step_pages)})")
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free:
+            # Sem auto_vacuum incremental o pragma não faz nada
+            break
+        freed += free - remaining
+        free = remaining
+    return freed
+
+
+def compact(db_path: str, days: int, archive_path: Optional[str] = None,
+            batch_size: int = BATCH_SIZE, step_pages: int = VACUUM_STEP_PAGES) -> Dict[str, int]:
+    """Compacta as VMs dos e-mails enviados há mais de ``days`` dias; retorna as contagens.
+
+    Um e-mail compactado fica marcado (emails.vms_compacted_at): se um reparse
+    recriar suas VMs, elas são removidas de novo sem somar outra vez no resumo.
+    """
+    cutoff = int(time.time()) - days * 86400
+    stats = {"emails": 0, "vms": 0, "pages": 0}
+    conn = connect(db_path)
+    written = changes.track_writes(conn)
+    try:
+        if archive_path:
+            # ATTACH não pode acontecer dentro de uma transação
+            conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            conn.execute("PRAGMA archive.journal_mode = WAL")
+            with conn:
+                columns = ", ".join(_prepare_archive(conn))
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("⚠️ Banco sem auto_vacuum incremental: rode uma vez python -m database.retention --full-vacuum")
+        last_id = 0
+        while True:
+            email_ids = [row[0] for row in conn.execute(f'''
+                SELECT e.id FROM emails e
+                WHERE e.sent_at < ? AND e.id > ? AND {COMPACTABLE}
+                  AND EXISTS (SELECT 1 FROM backup_jobs j JOIN backup_vms v ON v.job_id = j.id WHERE j.email_id = e.id)
+                ORDER BY e.id LIMIT ?
+            ''', (cutoff, last_id, batch_size))]
+            if not email_ids:
+                break
+            last_id = email_ids[-1]
+            placeholders = ",".join("?" * len(email_ids))
+            vms = f'SELECT v.id FROM backup_jobs j JOIN backup_vms v ON v.job_id = j.id WHERE j.email_id IN ({placeholders})'
+            with conn:
+                # IMMEDIATE: espera (busy_timeout) pela ingestão em vez de falhar ao passar de leitura a escrita
+                conn.execute("BEGIN IMMEDIATE")
+                if archive_path:
+                    # Reexecutar depois de uma falha entre os dois arquivos não duplica (mesmo id)
+                    conn.execute(f'''
+                        INSERT INTO archive.backup_vms ({columns})
+                        SELECT {columns} FROM main.backup_vms WHERE id IN ({vms})
+                        ON CONFLICT (id) DO NOTHING
+                    ''', email_ids)
+                _summarize(conn, email_ids)
+                # As triggers da busca textual removem as entradas dessas VMs
+                stats["vms"] += conn.execute(f'DELETE FROM main.backup_vms WHERE id IN ({vms})', email_ids).rowcount
+                conn.execute(f'''
+                    UPDATE emails SET vms_compacted_at = COALESCE(vms_compacted_at, CAST(strftime('%s', 'now') AS INTEGER))
+                    WHERE id IN ({placeholders})
+                ''', email_ids)
+                version = changes.bump(conn)
+            changes.notify(written, version)
+            stats["emails"] += len(email_ids)
+            stats["pages"] += incremental_vacuum(conn, step_pages)
+        return stats
+    finally:
+        conn.close()
+
+
+def full_vacuum(db_path: str):
+    """Ativa auto_vacuum incremental em um banco existente (reescreve o arquivo inteiro)"""
+    conn = connect(db_path)
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    from database.database import DatabaseManager
+
+    arg_parser = argparse.ArgumentParser(description="Compacta os detalhes de VMs antigos")
+    arg_parser.add_argument("--db", default="veeam_emails.db", help="banco dentro da pasta database/")
+    arg_parser.add_argument("--days", type=int, default=180, help="idade mínima, em dias, dos e-mails compactados")
+    arg_parser.add_argument("--archive", help="banco de arquivo (dentro da pasta database/) que recebe as VMs")
+    arg_parser.add_argument("--full-vacuum", action="store_true",
+                            help="só ativa o auto_vacuum incremental, com um VACUUM completo")
+    args = arg_parser.parse_args()
+
+    started = time.time()
+    db = DatabaseManager(args.db)
+    if args.full_vacuum:
+        full_vacuum(db.db_name)
+        print(f"✅ VACUUM completo em {time.time() - started:.1f}s")
+    else:
+        stats = db.apply_retention(args.days, args.archive)
+        print(f"✅ {stats['vms']} VMs de {stats['emails']} e-mails compactadas, "
+              f"{stats['pages']} páginas liberadas em {time.time() - started:.1f}s")
@@ -0,0 +1,102 @@
+"""Resumos diários (por job e geral) mantidos junto com as gravações.
+
+Reconstrução completa (a partir da raiz do projeto):
+    python -m database.rollups [--db veeam_emails.db]
+
+Cada job ou config backup gravado soma uma execução no dia do relatório
+(emails.date); o reparse subtrai antes de apagar. As contas usam as mesmas
+consultas de origem na gravação, na remoção e na reconstrução completa, para
+que o resumo incremental e o reconstruído sejam sempre iguais.
+"""
+import argparse
+import sqlite3
+import time
+from typing import Tuple
+
+# Status de uma execução: erro se houve algum erro, aviso se houve algum aviso
+JOB_SOURCE = '''
+    SELECT e.date AS day, COALESCE(j.job_name, '') AS job_name,
+           CASE WHEN CAST(j.summary_error AS INTEGER) > 0 THEN 'error'
+                WHEN CAST(j.summary_warning AS INTEGER) > 0 THEN 'warning'
+                ELSE 'success' END AS status,
+           j.backup_size_bytes AS backup_bytes, j.duration_seconds AS duration_seconds
+    FROM backup_jobs j JOIN emails e ON e.id = j.email_id
+'''
+# Config backups aparecem no dashboard como "Configuração: <servidor>"
+CONFIG_SOURCE = '''
+    SELECT e.date AS day, 'Configuração: ' || COALESCE(c.server, '') AS job_name,
+           CASE WHEN lower(c.status) IN ('error', 'failed') THEN 'error'
+                WHEN lower(c.status) = 'warning' THEN 'warning'
+                ELSE 'success' END AS status,
+           c.backup_size_bytes AS backup_bytes, c.duration_seconds AS duration_seconds
+    FROM config_backups c JOIN emails e ON e.id = c.email_id
+'''
+ROLLUP_TABLES = (("daily_job_summary", "day, job_name"), ("daily_summary", "day"))
+
+
+def create_tables(cursor):
+    for table, keys in ROLLUP_TABLES:
+        job_column = "job_name TEXT NOT NULL," if "job_name" in keys else ""
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                day TEXT NOT NULL,
+                {job_column}
+                runs INTEGER NOT NULL DEFAULT 0,
+                success INTEGER NOT NULL DEFAULT 0,
+                warning INTEGER NOT NULL DEFAULT 0,
+                error INTEGER NOT NULL DEFAULT 0,
+                backup_bytes INTEGER NOT NULL DEFAULT 0,
+                duration_seconds INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({keys})
+            ) WITHOUT ROWID
+        ''')
+
+
+def apply(conn: sqlite3.Connection, source: str, where: str, params: Tuple = (), sign: int = 1):
+    """Soma (``sign=1``) ou subtrai (``sign=-1``) nos resumos as linhas de ``source`` que atendem ``where``.
+
+    ``where`` referencia os valores de ``params`` como :p0, :p1, ...
+    """
+    named = {"sign": sign, **{f"p{i}": value for i, value in enumerate(params)}}
+    for table, keys in ROLLUP_TABLES:
+        conn.execute(f'''
+            INSERT INTO {table} ({keys}, runs, success, warning, error, backup_bytes, duration_seconds)
+            SELECT {keys}, :sign * COUNT(*),
+                   :sign * SUM(status = 'success'), :sign * SUM(status = 'warning'), :sign * SUM(status = 'error'),
+                   :sign * COALESCE(SUM(backup_bytes), 0), :sign * COALESCE(SUM(duration_seconds), 0)
+            FROM ({source} WHERE {where}) WHERE day IS NOT NULL
+            GROUP BY {keys}
+            ON CONFLICT ({keys}) DO UPDATE SET
+                runs = runs + excluded.runs,
+                success = success + excluded.success,
+                warning = warning + excluded.warning,
+                error = error + excluded.error,
+                backup_bytes = backup_bytes + excluded.backup_bytes,
+                duration_seconds = duration_seconds + excluded.duration_seconds
+        ''', named)
+        if sign < 0:
+            # Só as chaves afetadas; dias/jobs sem execuções restantes saem do resumo
+            conn.execute(f'''
+                DELETE FROM {table}
+                WHERE runs <= 0 AND ({keys}) IN (SELECT {keys} FROM ({source} WHERE {where}))
+            ''', named)
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Recalcula os resumos a partir de todos os jobs e config backups"""
+    for table, _ in ROLLUP_TABLES:
+        conn.execute(f'DELETE FROM {table}')
+    apply(conn, JOB_SOURCE, "1")
+    apply(conn, CONFIG_SOURCE, "1")
+
+
+if __name__ == "__main__":
+    from database.database import DatabaseManager
+
+    arg_parser = argparse.ArgumentParser(description="Reconstrói os resumos diários")
+    arg_parser.add_argument("--db", default="veeam_emails.db", help="banco dentro da pasta database/")
+    args = arg_parser.parse_args()
+
+    started = time.time()
+    DatabaseManager(args.db).rebuild_rollups()
+    print(f"✅ Resumos diários reconstruídos em {time.time() - started:.1f}s")
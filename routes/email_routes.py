@@ -1,35 +1,191 @@
-from flask import jsonify, request
-from datetime import datetime
-import sqlite3
+from flask import g, jsonify, request
+from datetime import datetime, timedelta
+import base64
+import json
 import os
+import sqlite3
+import time
 from api.email_api import EmailAPI
+from api.response_cache import ResponseCache
 from app import app
+from database import changes
 
 # Define o caminho absoluto do banco de dados na pasta database
 db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'veeam_emails.db')
 db_path = os.path.abspath(db_path)
 email_api = EmailAPI(db_name=db_path)
 
+# Respostas serializadas em memória; as gravações deste processo invalidam por tabela
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("API_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.environ.get("API_CACHE_MAX_MB", "64")) * 1024 * 1024
+)
+changes.add_listener(response_cache.invalidate)
+
+# Tabelas gravadas só por fora do projeto: nenhum commit daqui avisa quando mudam
+EXTERNAL_TABLES = {'email_data', 'config_catalogs'}
+
+# Rotas guardadas no cache e as tabelas de que dependem (as rotas que leem só
+# email_data ou config_catalogs ficam de fora)
+CACHED_ROUTES = {
+    'get_all_emails': ('emails', 'backup_jobs'),
+    'get_dashboard': ('emails', 'backup_jobs', 'config_backups', 'email_data'),
+    'get_email_metadata': ('emails',),
+    'get_emails_by_date': ('emails',),
+    'get_emails_in_range': ('emails',),
+    'get_all_backup_jobs': ('backup_jobs',),
+    'get_backup_jobs_with_errors': ('backup_jobs',),
+    'get_backup_jobs_in_range': ('backup_jobs',),
+    'get_backup_job': ('backup_jobs',),
+    'get_backup_jobs_by_email': ('backup_jobs',),
+    'get_backup_jobs_with_errors_by_email': ('backup_jobs',),
+    'get_all_vms': ('backup_vms',),
+    'get_vms_in_range': ('backup_vms',),
+    'get_vms_by_job': ('backup_vms',),
+    'get_all_config_backups': ('config_backups',),
+    'get_config_backup': ('config_backups',),
+    'get_config_backups_by_email': ('config_backups',),
+    'get_daily_summary': ('daily_summary', 'daily_job_summary'),
+    'get_monthly_vm_summary': ('monthly_vm_summary',),
+    'search': ('search_index', 'backup_vms', 'backup_jobs', 'config_backups'),
+}
+
+def cache_key():
+    return request.path, tuple(sorted(request.args.items(multi=True)))
+
+def cache_stamp(current):
+    """Marca que a entrada precisa reencontrar no cache para continuar valendo.
+
+    Quem lê tabelas de fora expira a cada commit de outra conexão (seen): uma
+    gravação de fora no mesmo intervalo de uma soma em change_version não muda
+    generation. As demais só expiram com gravações de fora (generation), já
+    que as gravações do projeto chegam por invalidate.
+    """
+    if EXTERNAL_TABLES & set(CACHED_ROUTES[request.endpoint]):
+        return current.seen
+    return current.generation
+
+# Muda a cada início do servidor: uma nova versão do código pode mudar o formato das respostas
+BOOT_ID = format(int(time.time()), 'x')
+
+@app.before_request
+def answer_without_query():
+    """GET /api/*: 304 se o banco não mudou desde a versão do cliente, senão a resposta do cache, se houver.
+
+    Nos dois casos nenhuma consulta é executada.
+    """
+    if request.method != 'GET' or not request.path.startswith('/api/') or request.endpoint == 'get_cache_stats':
+        return None
+    current = email_api.changes.current()
+    if current is None:
+        return None
+    # Lida antes da consulta: se houver gravação no meio, o próximo pedido já vem com outra versão
+    g.current = current
+    # generation muda com as gravações de fora do projeto (email_data, config_catalogs), que não somam em version
+    g.etag = f"{BOOT_ID}-{current.version}-{current.generation}"
+    # Só informativo: com resolução de 1 s e sem BOOT_ID, a data não basta para responder 304
+    g.last_modified = current.updated_at
+    not_modified = request.if_none_match.contains(g.etag)
+    if not_modified:
+        return app.response_class(status=304)
+    if request.endpoint in CACHED_ROUTES:
+        body = response_cache.get(cache_key(), current.version, cache_stamp(current))
+        if body is not None:
+            g.cache_hit = True
+            return app.response_class(body, mimetype='application/json')
+    return None
+
+@app.after_request
+def cache_and_add_validators(response):
+    if ('current' in g and response.status_code == 200 and request.endpoint in CACHED_ROUTES
+            and not g.get('cache_hit')):
+        response_cache.put(cache_key(), g.current.version, CACHED_ROUTES[request.endpoint], response.get_data(),
+                           cache_stamp(g.current))
+    if 'etag' in g and response.status_code in (200, 304):
+        response.set_etag(g.etag)
+        response.last_modified = g.last_modified
+        # O navegador guarda a resposta, mas sempre revalida com If-None-Match
+        response.cache_control.no_cache = True
+    return response
+
+@app.errorhandler(sqlite3.OperationalError)
+def database_unavailable(e):
+    """Erro do banco (ex.: ``database is locked`` durante a ingestão): 503, sem cache nem ETag"""
+    return jsonify({"error": f"Erro operacional no banco de dados: {e}"}), 503
+
+def parse_range_args():
+    """Lê ?from=&to= (YYYY-MM-DD ou ISO-8601) e devolve (início, fim) em epoch UTC, fim exclusivo.
+
+    Datas e horários sem fuso estão no fuso do servidor; um 'to' só com data
+    inclui o dia inteiro. Retorna (None, erro) se os parâmetros forem inválidos.
+    """
+    bounds = []
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        if not value:
+            return None, "Parâmetros 'from' e 'to' são obrigatórios"
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return None, f"Formato inválido em '{name}'. Use YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"
+        if name == 'to' and len(value) == 10:
+            moment += timedelta(days=1)
+        bounds.append(int(moment.timestamp()))
+    return tuple(bounds), None
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def wants_page():
+    """As listagens só paginam se o cliente pedir (?limit= ou ?cursor=); sem eles devolvem tudo, como antes"""
+    return 'limit' in request.args or 'cursor' in request.args
+
+def valid_key_value(field, value):
+    """id precisa ser inteiro; date e sent_time, texto (ou null, como vêm de e-mails sem data)"""
+    if field == 'id':
+        return isinstance(value, int) and not isinstance(value, bool)
+    return value is None or isinstance(value, str)
+
+def page_response(fetch, key_fields):
+    """Página de ?limit=&cursor= como {"items": [...], "next_cursor": ...}.
+
+    ``fetch(limit, after)`` recebe a chave (valores de ``key_fields``) do
+    último item da página anterior, ou None na primeira. O cursor é essa
+    chave em JSON/base64; next_cursor é null na última página.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "Parâmetro 'limit' deve ser inteiro"}), 400
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = json.loads(base64.urlsafe_b64decode(request.args['cursor'].encode()))
+            if not isinstance(after, list) or len(after) != len(key_fields) or not all(
+                    valid_key_value(field, value) for field, value in zip(key_fields, after)):
+                raise ValueError(after)
+        except ValueError:
+            return jsonify({"error": "Cursor inválido"}), 400
+    # Um item a mais indica se existe próxima página
+    items = fetch(limit + 1, after)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        key = [items[-1][field] for field in key_fields]
+        next_cursor = base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
 # 📩 Rotas para tabela emails
 @app.route('/api/emails/', methods=['GET'])
 def get_all_emails():
-    emails = email_api.get_all_emails()
-    # Remove duplicatas por id
-    unique_emails = {email['id']: email for email in emails}.values()
-    for email in unique_emails:
-        jobs = email_api.get_backup_jobs_by_email(email['id'])
-        # Remove duplicatas de jobs por id
-        jobs = {job['id']: job for job in jobs}.values()
-        for job in jobs:
-            if 'start_time' in job and job['start_time']:
-                parts = job['start_time'].split(' ')
-                job['data'] = parts[0] if len(parts) > 0 else ''
-                job['hora'] = parts[1][:5] if len(parts) > 1 else ''
-            else:
-                job['data'] = ''
-                job['hora'] = ''
-        email['backup_jobs'] = list(jobs)
-    return jsonify(list(unique_emails))
+    if wants_page():
+        return page_response(email_api.get_emails_page, ('date', 'sent_time', 'id'))
+    return jsonify(email_api.get_all_emails_with_jobs())
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Tudo o que o dashboard precisa na primeira carga, em uma única resposta"""
+    return jsonify({"emails": email_api.get_dashboard()})
 
 @app.route('/api/emails/<int:email_id>', methods=['GET'])
 def get_email_metadata(email_id):
@@ -50,6 +206,13 @@ def get_emails_by_date():
     emails = email_api.get_email_by_date(date)
     return jsonify(emails)
 
+@app.route('/api/emails/range', methods=['GET'])
+def get_emails_in_range():
+    bounds, error = parse_range_args()
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(email_api.get_emails_in_range(*bounds))
+
 # 📊 Rotas para tabela email_data
 @app.route('/api/email-data/', methods=['GET'])
 def get_all_email_data():
@@ -76,6 +239,8 @@ def get_email_data_by_date():
 # 📦 Rotas para backup_jobs
 @app.route('/api/backup-jobs/', methods=['GET'])
 def get_all_backup_jobs():
+    if wants_page():
+        return page_response(lambda limit, after: email_api.get_backup_jobs_page(limit, after[0] if after else None), ('id',))
     jobs = email_api.get_all_backup_jobs()
     # Remove duplicatas por id
     unique_jobs = {job['id']: job for job in jobs}.values()
@@ -83,16 +248,18 @@ def get_all_backup_jobs():
 
 @app.route('/api/backup-jobs/errors', methods=['GET'])
 def get_backup_jobs_with_errors():
-    with sqlite3.connect(email_api.db_name) as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM backup_jobs WHERE summary_error = 1")
-        rows = cursor.fetchall()
-        jobs = [dict(row) for row in rows]
+    jobs = email_api.get_backup_jobs_with_errors()
     # Remove duplicatas por id
     unique_jobs = {job['id']: job for job in jobs}.values()
     return jsonify(list(unique_jobs))
 
+@app.route('/api/backup-jobs/range', methods=['GET'])
+def get_backup_jobs_in_range():
+    bounds, error = parse_range_args()
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(email_api.get_backup_jobs_in_range(*bounds))
+
 @app.route('/api/backup-jobs/<int:job_id>', methods=['GET'])
 def get_backup_job(job_id):
     job = email_api.get_backup_job(job_id)
@@ -109,12 +276,7 @@ def get_backup_jobs_by_email(email_id):
 
 @app.route('/api/backup-jobs/errors/by-email/<int:email_id>', methods=['GET'])
 def get_backup_jobs_with_errors_by_email(email_id):
-    with sqlite3.connect(email_api.db_name) as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM backup_jobs WHERE summary_error = 1 AND email_id = ?", (email_id,))
-        rows = cursor.fetchall()
-        jobs = [dict(row) for row in rows]
+    jobs = email_api.get_backup_jobs_with_errors_by_email(email_id)
     # Remove duplicatas por id
     unique_jobs = {job['id']: job for job in jobs}.values()
     return jsonify(list(unique_jobs))
@@ -122,11 +284,20 @@ def get_backup_jobs_with_errors_by_email(email_id):
 # 🖥️ Rotas para backup_vms
 @app.route('/api/backup-vms/', methods=['GET'])
 def get_all_vms():
+    if wants_page():
+        return page_response(lambda limit, after: email_api.get_vms_page(limit, after[0] if after else None), ('id',))
     vms = email_api.get_all_vms()
     # Remove duplicatas por id
     unique_vms = {vm['id']: vm for vm in vms}.values()
     return jsonify(list(unique_vms))
 
+@app.route('/api/backup-vms/range', methods=['GET'])
+def get_vms_in_range():
+    bounds, error = parse_range_args()
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(email_api.get_vms_in_range(*bounds))
+
 @app.route('/api/backup-vms/by-job/<int:job_id>', methods=['GET'])
 def get_vms_by_job(job_id):
     vms = email_api.get_vms_by_job(job_id)
@@ -137,6 +308,8 @@ def get_vms_by_job(job_id):
 # 🔧 Rotas para config_backups
 @app.route('/api/config-backups/', methods=['GET'])
 def get_all_config_backups():
+    if wants_page():
+        return page_response(lambda limit, after: email_api.get_config_backups_page(limit, after[0] if after else None), ('id',))
     backups = email_api.get_all_config_backups()
     # Remove duplicatas por id
     unique_backups = {b['id']: b for b in backups}.values()
@@ -156,6 +329,55 @@ def get_config_backups_by_email(email_id):
     unique_backups = {b['id']: b for b in backups}.values()
     return jsonify(list(unique_backups))
 
+# 📈 Rotas para resumos diários
+@app.route('/api/summary/daily', methods=['GET'])
+def get_daily_summary():
+    """?from=&to= (YYYY-MM-DD, opcionais) e ?by=job para o detalhamento por job"""
+    start = request.args.get('from', '0001-01-01')
+    end = request.args.get('to', '9999-12-31')
+    for value in (start, end):
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({"error": "Formato de data inválido. Use YYYY-MM-DD"}), 400
+    if request.args.get('by') == 'job':
+        return jsonify(email_api.get_daily_job_summary(start, end))
+    return jsonify(email_api.get_daily_summary(start, end))
+
+@app.route('/api/summary/monthly-vms', methods=['GET'])
+def get_monthly_vm_summary():
+    """?from=&to= (YYYY-MM, opcionais); só inclui as VMs já compactadas pela retenção"""
+    start = request.args.get('from', '0001-01')
+    end = request.args.get('to', '9999-12')
+    for value in (start, end):
+        try:
+            datetime.strptime(value, '%Y-%m')
+        except ValueError:
+            return jsonify({"error": "Formato de mês inválido. Use YYYY-MM"}), 400
+    return jsonify(email_api.get_monthly_vm_summary(start, end))
+
+# 🔎 Busca textual
+@app.route('/api/search', methods=['GET'])
+def search():
+    """?q= (obrigatório), ?type=vm|job|config, ?limit= (até 200) e ?offset="""
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"error": "Parâmetro 'q' é obrigatório"}), 400
+    kind = request.args.get('type')
+    if kind and kind not in email_api.SEARCH_COLUMNS:
+        return jsonify({"error": "Parâmetro 'type' deve ser vm, job ou config"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "Parâmetros 'limit' e 'offset' devem ser inteiros"}), 400
+    return jsonify(email_api.search(text, kind, limit, offset))
+
+# 🗃️ Estatísticas do cache de respostas
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
 # 🔧 Rotas para config_catalogs
 @app.route('/api/config-catalogs/', methods=['GET'])
 def get_all_config_catalogs():
@@ -85,26 +85,11 @@ function getStatusBadge(isProcessed, email) {
 // ==================== Funções de Fetch ====================
 async function fetchEmails() {
     try {
-        const response = await fetch('/api/emails/');
+        // E-mails já vêm com backup_jobs, backup_data (hosts) e config_backups em uma única requisição
+        const response = await fetch('/api/dashboard');
         if (!response.ok) throw new Error('Erro ao carregar e-mails');
-        allEmails = await response.json();
-        // Carrega dados de backup_data (hosts) e config_backups para cada email
-        await Promise.all(allEmails.map(async (email) => {
-            try {
-                // Dados de hosts tradicionais
-                const resp = await fetch(`/api/email-data/by-email/${email.id}`);
-                email.backup_data = resp.ok ? await resp.json() : [];
-            } catch {
-                email.backup_data = [];
-            }
-            try {
-                // Dados de config_backups
-                const respConfig = await fetch(`/api/config-backups/by-email/${email.id}`);
-                email.config_backups = respConfig.ok ? await respConfig.json() : [];
-            } catch {
-                email.config_backups = [];
-            }
-        }));
+        const dashboard = await response.json();
+        allEmails = dashboard.emails;
         filteredEmails = [...allEmails];
         updateBackupSummary();
     } catch (error) {
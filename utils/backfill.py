@@ -0,0 +1,131 @@
+"""Carga offline de relatórios Veeam a partir de mbox, Maildir ou pastas de .eml.
+
+Uso (a partir da raiz do projeto):
+    python -m utils.backfill exportacao.mbox Maildir/ pasta_eml/ [--workers 8] [--batch-size 1000]
+
+As mensagens passam pelo mesmo parsing e gravação do EmailProcessor, sem
+acessar o servidor IMAP. A leitura, o parsing e a cópia para o arquivo de
+mensagens brutas rodam em processos paralelos e cada lote é gravado em uma
+única transação.
+"""
+import argparse
+import mailbox
+import os
+import time
+from functools import partial
+from typing import Iterator, List, Optional, Tuple, Union
+
+from utils.email_parser import EmailParser, parse_report
+from utils.email_processor import EmailProcessor
+from utils.pipeline import run_batches
+from utils.raw_archive import DEFAULT_ARCHIVE_DIR, RawArchive
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Um item é o caminho de um arquivo com uma mensagem ou os bytes de uma mensagem de mbox
+Source = Union[str, bytes]
+
+
+def _is_mbox(path: str) -> bool:
+    if path.endswith(".mbox") or os.path.basename(path) == "mbox":
+        return True
+    with open(path, "rb") as f:
+        return f.read(5) == b"From "
+
+
+def iter_sources(paths: List[str]) -> Iterator[Source]:
+    """Percorre arquivos e pastas, gerando cada mensagem encontrada.
+
+    Pastas são varridas recursivamente: arquivos .eml, arquivos dentro de
+    cur/ ou new/ (Maildir) e arquivos .mbox.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                in_maildir = os.path.basename(root) in ("cur", "new")
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    if name.endswith(".mbox"):
+                        yield from _iter_mbox(file_path)
+                    elif in_maildir or name.endswith(".eml"):
+                        yield file_path
+        elif _is_mbox(path):
+            yield from _iter_mbox(path)
+        else:
+            yield path
+
+
+def _iter_mbox(path: str) -> Iterator[bytes]:
+    box = mailbox.mbox(path, create=False)
+    try:
+        for key in box.iterkeys():
+            yield box.get_bytes(key)
+    finally:
+        box.close()
+
+
+def load_and_parse(source: Source, archive_dir: Optional[str] = None) -> Optional[Tuple[dict, dict]]:
+    """Lê, arquiva e parseia uma mensagem; roda nos processos do pool"""
+    try:
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                raw = f.read()
+        else:
+            raw = source
+        record = EmailParser.parse_message(raw)
+        if archive_dir:
+            record["raw_key"] = RawArchive(archive_dir).put(raw, record["message_id"])
+        return record, parse_report(record["body"])
+    except Exception as e:
+        label = source if isinstance(source, str) else "mensagem de mbox"
+        print(f"⚠️ Ignorando {label}: {e}")
+        return None
+
+
+def _chunks(items: Iterator[Source], size: int) -> Iterator[List[Source]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def backfill(paths: List[str], db_name: str = "veeam_emails.db", workers: Optional[int] = None,
+             batch_size: int = BACKFILL_BATCH_SIZE, archive_dir: Optional[str] = DEFAULT_ARCHIVE_DIR) -> Tuple[int, int]:
+    """Carrega as mensagens de ``paths`` no banco; retorna (lidas, novas)"""
+    processor = EmailProcessor(None, None, None, db_name=db_name)
+    processor.verbose = False
+    workers = workers or os.cpu_count() or 1
+    load = partial(load_and_parse, archive_dir=archive_dir)
+    read = stored = 0
+
+    def store(results):
+        nonlocal read, stored
+        with processor.db.transaction():
+            for result in results:
+                read += 1
+                if result and processor.process_email(result[0], read, result[1]):
+                    stored += 1
+        print(f"📥 {read} mensagens lidas, {stored} novas...")
+
+    run_batches(_chunks(iter_sources(paths), batch_size), load, store, workers, batch_size)
+    return read, stored
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Carga offline de e-mails do Veeam")
+    arg_parser.add_argument("paths", nargs="+", help="arquivos mbox/.eml ou pastas (Maildir ou com .eml)")
+    arg_parser.add_argument("--db", default="veeam_emails.db", help="banco dentro da pasta database/")
+    arg_parser.add_argument("--workers", type=int, default=None, help="processos de leitura/parsing")
+    arg_parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="mensagens por transação")
+    arg_parser.add_argument("--archive", default=DEFAULT_ARCHIVE_DIR,
+                            help="pasta do arquivo de mensagens brutas (vazio para não arquivar)")
+    args = arg_parser.parse_args()
+
+    started = time.time()
+    total, new = backfill(args.paths, args.db, args.workers, args.batch_size, args.archive)
+    print(f"✅ Backfill concluído: {total} mensagens lidas, {new} novas em {time.time() - started:.1f}s")
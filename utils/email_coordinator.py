@@ -0,0 +1,119 @@
+"""Ingestão concorrente de várias contas e pastas IMAP em um único event loop.
+
+As fontes são lidas de um arquivo JSON (ver EMAIL_SOURCES_FILE no README):
+
+    [
+        {"email": "veeam1@dominio.com", "password_env": "VEEAM1_PASSWORD",
+         "target_sender": "veeam@dominio.com", "host": "imap.dominio.com",
+         "mailboxes": ["inbox", "Veeam/Filial"], "min_interval": 600},
+        ...
+    ]
+
+Cada par conta/pasta vira um EmailProcessor com o próprio watermark
+(``email@host/pasta``) e todos são verificados ao mesmo tempo; o ciclo
+termina quando a caixa mais lenta termina.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from utils.email_parser import FETCH_BATCH_SIZE, IMAP_HOST, IMAP_PORT
+from utils.email_processor import EmailProcessor
+
+# Sessões IMAP simultâneas por servidor; muitos provedores recusam conexões acima disso
+MAX_CONNECTIONS_PER_HOST = 4
+
+
+@dataclass
+class EmailSource:
+    """Uma pasta de uma conta IMAP a ser monitorada"""
+    email: str
+    password: str
+    target_sender: str
+    host: str = IMAP_HOST
+    port: int = IMAP_PORT
+    mailbox: str = "inbox"
+    # Intervalo mínimo, em segundos, entre duas verificações desta pasta
+    min_interval: float = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.email}@{self.host}/{self.mailbox}"
+
+
+def load_sources(path: str) -> List[EmailSource]:
+    """Lê o arquivo JSON de fontes, expandindo ``mailboxes`` em uma fonte por pasta.
+
+    A senha pode vir em ``password`` ou, preferencialmente, no nome de uma
+    variável de ambiente em ``password_env``.
+    """
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    sources = []
+    for entry in entries:
+        password = entry.get("password")
+        if password is None and entry.get("password_env"):
+            password = os.environ.get(entry["password_env"])
+        for mailbox in entry.get("mailboxes", ["inbox"]):
+            sources.append(EmailSource(
+                email=entry["email"],
+                password=password,
+                target_sender=entry["target_sender"],
+                host=entry.get("host", IMAP_HOST),
+                port=int(entry.get("port", IMAP_PORT)),
+                mailbox=mailbox,
+                min_interval=float(entry.get("min_interval", 0)),
+            ))
+    return sources
+
+
+class IngestionCoordinator:
+    """Verifica todas as fontes em paralelo a cada ciclo.
+
+    O imaplib é bloqueante, então cada verificação roda em uma thread via
+    ``asyncio.to_thread``; o event loop só coordena. Os limites por fonte
+    (``min_interval``) e por servidor (``max_per_host`` sessões simultâneas)
+    evitam bloqueios do provedor quando há muitas pastas na mesma conta.
+    """
+
+    def __init__(self, sources: List[EmailSource], db_name: str = "veeam_emails.db",
+                 fetch_batch_size: int = FETCH_BATCH_SIZE, parse_workers: int = 0,
+                 archive_dir: Optional[str] = None, max_per_host: int = MAX_CONNECTIONS_PER_HOST):
+        self.sources = sources
+        self.max_per_host = max(1, max_per_host)
+        self.processors: Dict[str, EmailProcessor] = {
+            source.key: EmailProcessor(source.email, source.password, source.target_sender, db_name=db_name,
+                                       fetch_batch_size=fetch_batch_size, parse_workers=parse_workers,
+                                       archive_dir=archive_dir, host=source.host, port=source.port,
+                                       mailbox=source.mailbox)
+            for source in sources
+        }
+        self._last_run: Dict[str, float] = {}
+
+    def run_cycle(self):
+        """Executa um ciclo completo de forma síncrona (para o loop de polling do app)"""
+        asyncio.run(self.poll_all())
+
+    async def poll_all(self):
+        # Semáforos criados dentro do loop em execução
+        host_limits = defaultdict(lambda: asyncio.Semaphore(self.max_per_host))
+        started = time.monotonic()
+        await asyncio.gather(*(self._poll(source, host_limits[source.host]) for source in self.sources))
+        print(f"📬 {len(self.sources)} caixas verificadas em {time.monotonic() - started:.1f}s")
+
+    async def _poll(self, source: EmailSource, host_limit: asyncio.Semaphore):
+        last_run = self._last_run.get(source.key)
+        if last_run is not None and time.monotonic() - last_run < source.min_interval:
+            return
+        async with host_limit:
+            self._last_run[source.key] = time.monotonic()
+            print(f"📧 Verificando {source.key}...")
+            try:
+                # fetch_and_process já trata erros de IMAP; isto cobre falhas de banco
+                await asyncio.to_thread(self.processors[source.key].fetch_and_process)
+            except Exception as e:
+                print(f"❌ Erro ao processar {source.key}: {e}")
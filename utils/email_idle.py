@@ -0,0 +1,52 @@
+import time
+
+from utils.email_processor import EmailProcessor
+
+try:
+    import imaplib2
+except ImportError:  # imaplib2 é opcional; sem ele o app continua no modo de polling
+    imaplib2 = None
+
+# RFC 2177: o servidor pode derrubar sessões em IDLE após 30 minutos
+IDLE_TIMEOUT = 29 * 60
+MAX_BACKOFF = 300
+
+class EmailIdleWatcher:
+    """Mantém uma sessão IMAP aberta em IDLE e ingere novas mensagens assim que chegam"""
+
+    def __init__(self, processor: EmailProcessor, idle_timeout: int = IDLE_TIMEOUT, max_backoff: int = MAX_BACKOFF):
+        if imaplib2 is None:
+            raise RuntimeError("Modo IDLE requer o pacote imaplib2 (pip install imaplib2)")
+        self.processor = processor
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+
+    def run_forever(self):
+        backoff = 1
+        while True:
+            mail = None
+            try:
+                mail = self.processor.parser.connect(imap_module=imaplib2)
+                print("📡 Sessão IMAP aberta em modo IDLE.")
+                backoff = 1
+                # Recupera o que chegou enquanto a sessão estava fechada
+                self.processor.fetch_and_process(mail)
+                while True:
+                    # Retorna quando o servidor avisa algo (ex.: EXISTS) ou no timeout;
+                    # em ambos os casos só os UIDs acima do watermark são buscados
+                    mail.idle(timeout=self.idle_timeout)
+                    self.processor.fetch_and_process(mail)
+            except Exception as e:
+                print(f"❌ Sessão IDLE interrompida: {e}. Reconectando em {backoff}s...")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                if mail is not None:
+                    self._logout(mail)
+
+    @staticmethod
+    def _logout(mail):
+        try:
+            mail.logout()
+        except Exception:
+            pass
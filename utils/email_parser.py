@@ -3,41 +3,182 @@ import email
 from email.header import decode_header
 import re
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Set, Tuple, Optional
+
+IMAP_HOST = "imap.skymail.net.br"
+IMAP_PORT = 993
+FETCH_BATCH_SIZE = 500
+# Incrementar sempre que uma mudança no parsing alterar as linhas de
+# backup_jobs/backup_vms/config_backups; o reparse refaz os e-mails com versão antiga
+PARSER_VERSION = 1
+# Tipos de relatório gravados em emails.report_kind (usados pelo reparse seletivo)
+REPORT_KINDS = ("config", "agent", "job")
+HEADER_FETCH_ITEMS = "(UID BODY.PEEK[HEADER.FIELDS (MESSAGE-ID DATE SUBJECT)])"
 
 class EmailParser:
-    def __init__(self, email_addr: str, password: str, target_sender: str):
+    def __init__(self, email_addr: str, password: str, target_sender: str,
+                 host: str = IMAP_HOST, port: int = IMAP_PORT, mailbox: str = "inbox",
+                 fetch_batch_size: int = FETCH_BATCH_SIZE):
         self.email = email_addr
         self.password = password
         self.target_sender = target_sender
+        self.host = host
+        self.port = port
+        self.mailbox = mailbox
+        self.fetch_batch_size = max(1, fetch_batch_size)
+        # UIDVALIDITY e maior UID vistos na última sessão (preenchidos por fetch_emails)
+        self.uidvalidity: Optional[int] = None
+        self.highest_uid: Optional[int] = None
+
+    @property
+    def mailbox_key(self) -> str:
+        """Identificador da caixa usado para persistir o watermark"""
+        return f"{self.email}@{self.host}/{self.mailbox}"
+
+    def connect(self, imap_module=imaplib):
+        """Abre uma sessão autenticada com a caixa já selecionada"""
+        mail = imap_module.IMAP4_SSL(self.host, self.port)
+        mail.login(self.email, self.password)
+        mail.select(self.mailbox)
+        self.uidvalidity = self._get_uidvalidity(mail)
+        return mail
 
-    def fetch_emails(self) -> List[Dict]:
+    def fetch_emails(self, watermark: Optional[Tuple[int, int]] = None,
+                     is_known: Optional[Callable[[Iterable[str]], Set[str]]] = None) -> List[Dict]:
+        """Abre uma sessão e devolve todas as mensagens novas de uma vez (ver iter_new).
+
+        Mantém em memória todos os corpos baixados; para caixas grandes prefira
+        consumir iter_new lote a lote.
+        """
+        self.uidvalidity = None
+        self.highest_uid = None
         try:
-            with imaplib.IMAP4_SSL("imap.skymail.net.br", 993) as mail:
-                mail.login(self.email, self.password)
-                mail.select("inbox")
-                status, messages = mail.search(None, f'FROM "{self.target_sender}"')
-                if status != "OK":
-                    return []
-                return self._process_messages(mail, messages[0].split())
+            with self.connect() as mail:
+                return [e for batch in self.iter_new(mail, watermark, is_known) for e in batch]
         except Exception as e:
             print(f"❌ Erro ao buscar e-mails: {e}")
             return []
 
-    def _process_messages(self, mail, email_ids: List[bytes]) -> List[Dict]:
-        emails = []
-        for email_id in email_ids:
-            status, data = mail.fetch(email_id, "(RFC822)")
-            if status == "OK":
-                msg = email.message_from_bytes(data[0][1])
-                subject = self._decode_header(msg["Subject"])
-                date = msg["Date"]
-                emails.append({
-                    "subject": subject,
-                    "date": date,
-                    "body": self._extract_body(msg)
-                })
-        return emails
+    def iter_new(self, mail, watermark: Optional[Tuple[int, int]] = None,
+                 is_known: Optional[Callable[[Iterable[str]], Set[str]]] = None) -> Iterator[List[Dict]]:
+        """Gera, lote a lote, as mensagens com UID acima do watermark (uidvalidity, last_uid).
+
+        Cada lote tem no máximo ``fetch_batch_size`` mensagens e só é baixado
+        quando o anterior foi consumido; ``highest_uid`` acompanha o último
+        lote entregue. Se o UIDVALIDITY do servidor mudou, os UIDs antigos não
+        valem mais e a caixa inteira é ressincronizada. Quando ``is_known`` é
+        informado, os Message-IDs já armazenados são descartados antes de
+        baixar os corpos. Erros de conexão são propagados para quem mantém a
+        sessão.
+        """
+        self.highest_uid = None
+        last_uid = 0
+        if watermark:
+            if watermark[0] == self.uidvalidity:
+                last_uid = watermark[1]
+            else:
+                print("🔄 UIDVALIDITY alterado, ressincronizando a caixa inteira...")
+        uids = self._search_uids(mail, last_uid)
+        yield from self._process_messages(mail, uids, is_known)
+
+    @staticmethod
+    def _get_uidvalidity(mail) -> Optional[int]:
+        _, data = mail.response("UIDVALIDITY")
+        if data and data[0]:
+            return int(data[0])
+        return None
+
+    def _search_uids(self, mail, last_uid: int) -> List[bytes]:
+        status, messages = mail.uid("search", None, f'UID {last_uid + 1}:* FROM "{self.target_sender}"')
+        if status != "OK" or not messages or not messages[0]:
+            return []
+        # "n:*" sempre inclui a última mensagem da caixa, mesmo com UID <= n
+        return [uid for uid in messages[0].split() if int(uid) > last_uid]
+
+    def _process_messages(self, mail, email_ids: List[bytes],
+                          is_known: Optional[Callable[[Iterable[str]], Set[str]]] = None) -> Iterator[List[Dict]]:
+        for start in range(0, len(email_ids), self.fetch_batch_size):
+            batch = email_ids[start:start + self.fetch_batch_size]
+            emails = []
+            pending, message_ids = batch, {}
+            if is_known:
+                pending, message_ids = self._filter_known(mail, batch, is_known)
+            # O watermark só passa das mensagens já conhecidas e das efetivamente baixadas
+            done = {int(uid) for uid in batch} - {int(uid) for uid in pending}
+            if pending:
+                for uid, raw in self._fetch_batch(mail, pending, "(UID RFC822)"):
+                    record = self.parse_message(raw)
+                    record["uid"] = uid
+                    record["raw"] = raw
+                    record["message_id"] = message_ids.get(uid) or record["message_id"]
+                    emails.append(record)
+                    done.add(uid)
+            self.highest_uid = max([self.highest_uid or 0] + list(done))
+            yield emails
+
+    def _filter_known(self, mail, uids: List[bytes],
+                      is_known: Callable[[Iterable[str]], Set[str]]) -> Tuple[List[bytes], Dict[int, str]]:
+        """Baixa só os cabeçalhos do lote e remove as mensagens cujo Message-ID já existe"""
+        message_ids = {}
+        for uid, raw in self._fetch_batch(mail, uids, HEADER_FETCH_ITEMS):
+            message_id = self._message_id(email.message_from_bytes(raw))
+            if message_id:
+                message_ids[uid] = message_id
+        known = is_known(message_ids.values()) if message_ids else set()
+        # Mensagens sem Message-ID seguem para o download e para a deduplicação antiga
+        pending = [uid for uid in uids if message_ids.get(int(uid)) not in known]
+        return pending, message_ids
+
+    @staticmethod
+    def parse_message(raw: bytes) -> Dict:
+        """Decodifica uma mensagem RFC822 bruta no registro usado pelo EmailProcessor"""
+        msg = email.message_from_bytes(raw)
+        return {
+            "message_id": EmailParser._message_id(msg),
+            "subject": EmailParser._decode_header(msg["Subject"]),
+            "date": msg["Date"],
+            "body": EmailParser._extract_body(msg)
+        }
+
+    @staticmethod
+    def _message_id(msg) -> Optional[str]:
+        value = msg["Message-ID"]
+        return " ".join(str(value).split()) if value else None
+
+    @staticmethod
+    def _fetch_batch(mail, uids: List[bytes], items: str) -> List[Tuple[int, bytes]]:
+        """Executa um único UID FETCH para o lote e separa a resposta por mensagem.
+
+        Uma resposta sem OK ou sem alguma das mensagens pedidas gera
+        imaplib.IMAP4.error: o lote não é entregue e o watermark não passa dele.
+        """
+        wanted = sorted({int(uid) for uid in uids})
+        status, data = mail.uid("fetch", EmailParser._uid_sequence_set(wanted), items)
+        if status != "OK" or not data:
+            raise imaplib.IMAP4.error(f"UID FETCH falhou ({status}) para {len(wanted)} mensagens")
+        messages = {}
+        for part in data:
+            # Cada mensagem chega como (b'N (UID 123 RFC822 {tam}', conteúdo); o b')' final é descartado
+            if not isinstance(part, tuple):
+                continue
+            m = re.search(rb'UID (\d+)', part[0])
+            if m:
+                messages[int(m.group(1))] = part[1]
+        missing = [uid for uid in wanted if uid not in messages]
+        if missing:
+            raise imaplib.IMAP4.error(f"UID FETCH não devolveu {len(missing)} mensagens (UIDs {missing[:10]})")
+        return [(uid, messages[uid]) for uid in wanted]
+
+    @staticmethod
+    def _uid_sequence_set(uids: List[int]) -> str:
+        """Compacta UIDs ordenados em um sequence set IMAP (ex.: 1:5,7,9:12)"""
+        ranges = []
+        for uid in uids:
+            if ranges and uid == ranges[-1][1] + 1:
+                ranges[-1][1] = uid
+            else:
+                ranges.append([uid, uid])
+        return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
 
     @staticmethod
     def _decode_header(header):
@@ -225,4 +366,271 @@ class EmailParser:
             num = m.group(1).replace(',', '.')
             unit = m.group(2).upper()
             return f"{num} {unit}"
-        return value.strip().split()[0] + " B"
\ No newline at end of file
+        return value.strip().split()[0] + " B"
+
+
+# --- Tokenizador de passada única para relatórios de jobs ---
+# Mesmos padrões de EmailParser.extract_job_info, compilados uma única vez.
+_JOB_MARKER = "Backup job:"
+_JOB_LINE_PREFIXES = ("Agent Backup job:", "Backup job:")
+_JOB_NAME_RE = re.compile(r'(?:Agent )?Backup job:\s*(.+)')
+_CREATED_RE = re.compile(r'Created by ([^\\]+\\[^\s]+) at ([\d/]+ [\d:]+)')
+_PROCESSED_RE = re.compile(r'(\d+) of (\d+) (?:VMs|hosts) processed')
+_VM_DETAILS_RE = re.compile(r'Details\s*\*Name\*.*?\*Details\*\n(.+?)(?=(?:Agent )?Backup job:|Backup job:|$)', re.DOTALL)
+_VM_SPLIT_RE = re.compile(r'\s{2,}|\t| (?=\d{2}:\d{2}:\d{2})')
+# Ordem em que extract_job_info preenche o dict do job
+_JOB_FIELD_ORDER = (
+    'job_name', 'created_by', 'created_at', 'processed_vms', 'processed_vms_total',
+    'summary_success', 'start_time', 'total_size', 'backup_size',
+    'summary_warning', 'end_time', 'data_read', 'dedupe',
+    'summary_error', 'duration', 'transferred', 'compression',
+)
+# (âncora, literais que devem aparecer uma única vez na linha, padrão, campos)
+_SUMMARY_ROWS = (
+    ('*Success*', ('*Success*', '*Start time*', '*Total size*', '*Backup size*'),
+     re.compile(r'\*Success\*\s*(\d+).*?\*Start time\*\s*([\d:]+).*?\*Total size\*\s*([^\*]+)\*Backup size\*\s*([^\n]+)', re.DOTALL),
+     ('summary_success', 'start_time', 'total_size', 'backup_size')),
+    ('*Warning*', ('*Warning*', '*End time*', '*Data read*', '*Dedupe*'),
+     re.compile(r'\*Warning\*\s*(\d+).*?\*End time\*\s*([\d:]+).*?\*Data read\*\s*([^\*]+)\*Dedupe\*\s*([^\n]+)', re.DOTALL),
+     ('summary_warning', 'end_time', 'data_read', 'dedupe')),
+    ('*Error*', ('*Error*', '*Duration*', '*Transferred*', '*Compression*'),
+     re.compile(r'\*Error\*\s*(\d+).*?\*Duration\*\s*([\d:]+).*?\*Transferred\*\s*([^\*]+)\*Compression\*\s*([^\n]+)', re.DOTALL),
+     ('summary_error', 'duration', 'transferred', 'compression')),
+)
+
+
+def _vm_from_line(line: str) -> Optional[Dict]:
+    parts = _VM_SPLIT_RE.split(line.strip())
+    if len(parts) < 9:
+        parts = line.strip().split()
+    if len(parts) < 8:
+        return None
+    return {
+        'name': parts[0],
+        'status': parts[1],
+        'start_time': parts[2],
+        'end_time': parts[3],
+        'size': parts[4],
+        'read': parts[5],
+        'transferred': parts[6],
+        'duration': parts[7],
+        'details': ' '.join(parts[8:]) if len(parts) > 8 else ''
+    }
+
+
+class _JobBlock:
+    """Estado de um bloco "Backup job:" enquanto suas linhas são lidas.
+
+    Cada campo é extraído da primeira linha que contém sua âncora, como o
+    ``re.search`` do parser original faria sobre o bloco inteiro. Quando a
+    linha não segue o layout padrão (ex.: valor quebrado em outra linha), o
+    campo é marcado para ser resolvido com a regex original no fim do bloco.
+    """
+
+    def __init__(self, lines: List[str], start: int):
+        self.lines = lines
+        self.start = start
+        self.job: Dict = {}
+        self.fallbacks: List[str] = []
+        self.pending_created = True
+        self.pending_processed = True
+        self.pending_rows = list(_SUMMARY_ROWS)
+        # Cabeçalho da tabela de VMs: None -> procurando "Details", "name" -> aguardando
+        # a linha "*Name*", "end" -> aguardando a linha terminada em "*Details*", "vms" -> lendo VMs
+        self.vm_state = None
+        self.vm_lines: List[str] = []
+
+        first = lines[start]
+        rest = first[first.index(_JOB_MARKER) + len(_JOB_MARKER):]
+        if rest.strip():
+            self.job['job_name'] = rest.strip()
+        else:
+            self.fallbacks.append('job_name')
+
+    def feed(self, index: int, line: str):
+        if self.vm_state == "vms":
+            self.vm_lines.append(line)
+        elif self.vm_state == "end":
+            self._check_header_end(index, line, 0)
+        else:
+            self._check_header_start(index, line)
+        if self.pending_created and "Created by " in line:
+            self.pending_created = False
+            m = _CREATED_RE.match(line, line.index("Created by "))
+            if m:
+                self.job['created_by'] = m.group(1)
+                self.job['created_at'] = m.group(2)
+            else:
+                self.fallbacks.append('created')
+        if self.pending_processed and " processed" in line:
+            m = _PROCESSED_RE.search(line)
+            if m:
+                self.pending_processed = False
+                self.job['processed_vms'] = m.group(1)
+                self.job['processed_vms_total'] = m.group(2)
+        if self.pending_rows:
+            for row in [r for r in self.pending_rows if r[0] in line]:
+                self.pending_rows.remove(row)
+                self._read_summary_row(line, row)
+
+    def _read_summary_row(self, line: str, row):
+        anchor, literals, pattern, keys = row
+        m = None
+        if all(line.count(literal) == 1 for literal in literals):
+            m = pattern.match(line, line.index(anchor))
+        # Valor vazio no fim da linha: a regex original continuaria na linha seguinte
+        if not m or not m.group(4).strip():
+            self.fallbacks.append(anchor)
+            return
+        self.job[keys[0]] = m.group(1)
+        self.job[keys[1]] = m.group(2)
+        self.job[keys[2]] = m.group(3).strip()
+        self.job[keys[3]] = m.group(4).strip()
+
+    def _check_header_start(self, index: int, line: str):
+        if self.vm_state == "name":
+            stripped = line.lstrip()
+            if not stripped:
+                return
+            if stripped.startswith("*Name*"):
+                self.vm_state = "end"
+                self._check_header_end(index, line, len(line) - len(stripped) + len("*Name*"))
+                return
+            self.vm_state = None
+        pos = line.find("Details")
+        while pos != -1:
+            rest = line[pos + len("Details"):]
+            stripped = rest.lstrip()
+            if stripped.startswith("*Name*"):
+                self.vm_state = "end"
+                self._check_header_end(index, line, len(line) - len(stripped) + len("*Name*"))
+                return
+            if not stripped:
+                self.vm_state = "name"
+                return
+            pos = line.find("Details", pos + 1)
+
+    def _check_header_end(self, index: int, line: str, offset: int):
+        # "*Details*\n" exige que a linha não seja a última do corpo
+        if line[offset:].endswith("*Details*") and index < len(self.lines) - 1:
+            self.vm_state = "vms"
+
+    def finish(self, end: int) -> Tuple[Optional[Dict], List[Dict]]:
+        text = None
+        if self.fallbacks:
+            text = self._block_text(end)
+            self._apply_fallbacks(text)
+        if not self.job.get('job_name'):
+            return None, []
+        job = {key: self.job[key] for key in _JOB_FIELD_ORDER if key in self.job}
+        if self.vm_state is None:
+            # Nenhum "Details" seguido de "*Name*": a regex original também não acharia a tabela
+            vms = []
+        elif self.vm_state == "vms" and self._has_vm_section(end):
+            body = "\n".join(self.vm_lines).strip()
+            vms = [vm for vm in map(_vm_from_line, body.split('\n')) if vm]
+        else:
+            vms = EmailParser.extract_vm_details(text or self._block_text(end))
+        return job, vms
+
+    def _has_vm_section(self, end: int) -> bool:
+        # (.+?) da regex original precisa de ao menos um caractere após o cabeçalho
+        trailing_newline = end < len(self.lines)
+        return bool(self.vm_lines) and (any(self.vm_lines) or len(self.vm_lines) > 1 or trailing_newline)
+
+    def _block_text(self, end: int) -> str:
+        first = self.lines[self.start]
+        text = "\n".join([first[first.index(_JOB_MARKER):]] + self.lines[self.start + 1:end])
+        return text + "\n" if end < len(self.lines) else text
+
+    def _apply_fallbacks(self, text: str):
+        for field in self.fallbacks:
+            if field == 'job_name':
+                m = _JOB_NAME_RE.search(text)
+                if m:
+                    self.job['job_name'] = m.group(1).strip()
+            elif field == 'created':
+                m = _CREATED_RE.search(text)
+                if m:
+                    self.job['created_by'] = m.group(1)
+                    self.job['created_at'] = m.group(2)
+            else:
+                _, _, pattern, keys = next(r for r in _SUMMARY_ROWS if r[0] == field)
+                m = pattern.search(text)
+                if m:
+                    self.job[keys[0]] = m.group(1)
+                    self.job[keys[1]] = m.group(2)
+                    self.job[keys[2]] = m.group(3).strip()
+                    self.job[keys[3]] = m.group(4).strip()
+
+
+def tokenize_jobs_info(body: str) -> list:
+    """Versão de passada única de EmailParser.extract_jobs_info (mesma saída).
+
+    Percorre as linhas do corpo uma vez, abrindo um bloco a cada linha
+    "Backup job:"/"Agent Backup job:" e alimentando o bloco corrente. Corpos
+    com "Backup job:" no meio de uma linha usam o parser original.
+    """
+    lines = body.split('\n')
+    blocks = []
+    block = None
+    for index, line in enumerate(lines):
+        if _JOB_MARKER in line:
+            if line.count(_JOB_MARKER) != 1 or not line.startswith(_JOB_LINE_PREFIXES):
+                return EmailParser.extract_jobs_info(body)
+            if block:
+                blocks.append(block.finish(index))
+            block = _JobBlock(lines, index)
+        if block:
+            block.feed(index, line)
+    if block:
+        blocks.append(block.finish(len(lines)))
+
+    result = []
+    seen_jobs = set()
+    for job_info, vm_list in blocks:
+        if not job_info:
+            continue
+        job_key = (
+            job_info.get('job_name'),
+            job_info.get('start_time'),
+            job_info.get('end_time'),
+            job_info.get('created_by'),
+            job_info.get('created_at')
+        )
+        if job_key in seen_jobs:
+            continue
+        unique_vms = []
+        seen_vm_keys = set()
+        for vm in vm_list:
+            vm_key = (vm.get('name'), vm.get('start_time'), vm.get('end_time'), vm.get('status'))
+            if vm_key not in seen_vm_keys:
+                unique_vms.append(vm)
+                seen_vm_keys.add(vm_key)
+        result.append((job_info, unique_vms))
+        seen_jobs.add(job_key)
+    return result
+
+
+def parse_report(body: str) -> Dict:
+    """Extrai os registros de um corpo de e-mail Veeam como dicts/listas simples.
+
+    Retorna ``{"kind": "config", "config": info}`` para backups de
+    configuração ou ``{"kind": "agent"|"job", "jobs": [(job_info, vm_list), ...]}``
+    com os tamanhos já normalizados. É uma função de módulo para poder ser
+    enviada a um ProcessPoolExecutor.
+    """
+    if EmailParser.is_config_backup_email(body):
+        config_info = EmailParser.extract_config_backup_info(body)
+        if config_info:
+            config_info["data_size"] = EmailParser.clean_size_field(config_info.get("data_size", ""))
+            config_info["backup_size"] = EmailParser.clean_size_field(config_info.get("backup_size", ""))
+        return {"kind": "config", "config": config_info}
+    jobs_info = tokenize_jobs_info(body)
+    for job_info, _ in jobs_info:
+        job_info['total_size'] = EmailParser.clean_size_field(job_info.get('total_size', ''))
+        job_info['backup_size'] = EmailParser.clean_size_field(job_info.get('backup_size', ''))
+        job_info['data_read'] = EmailParser.clean_size_field(job_info.get('data_read', ''))
+        job_info['transferred'] = EmailParser.clean_size_field(job_info.get('transferred', ''))
+    kind = "agent" if "Agent Backup job:" in body else "job"
+    return {"kind": kind, "jobs": jobs_info}
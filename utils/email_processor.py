@@ -1,48 +1,125 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, List, Optional
+
 from database.database import DatabaseManager
-from utils.email_parser import EmailParser
+from utils.email_parser import EmailParser, FETCH_BATCH_SIZE, IMAP_HOST, IMAP_PORT, PARSER_VERSION, parse_report
+from utils.raw_archive import RawArchive
 
 class EmailProcessor:
     """Classe para processar e-mails do Veeam e armazenar no banco de dados SQLite"""
     
-    def __init__(self, email: str, password: str, target_sender: str, db_name: str = "veeam_emails.db"):
+    def __init__(self, email: str, password: str, target_sender: str, db_name: str = "veeam_emails.db",
+                 fetch_batch_size: int = FETCH_BATCH_SIZE, parse_workers: int = 0,
+                 archive_dir: Optional[str] = None, host: str = IMAP_HOST, port: int = IMAP_PORT,
+                 mailbox: str = "inbox"):
         self.db = DatabaseManager(db_name)
-        self.parser = EmailParser(email, password, target_sender)
+        self.parser = EmailParser(email, password, target_sender, host=host, port=port, mailbox=mailbox,
+                                  fetch_batch_size=fetch_batch_size)
+        # Com mais de 1 worker, o parsing de cada lote é distribuído entre processos
+        self.parse_workers = parse_workers
+        # Mensagens por e-mail gravado; desligado em cargas em massa (backfill)
+        self.verbose = True
+        # Cópia comprimida das mensagens brutas, usada pelo reparse sem rede
+        self.archive = RawArchive(archive_dir) if archive_dir else None
+
+    def fetch_and_process(self, mail=None):
+        """Fluxo principal: buscar, processar e armazenar e-mails.
 
-    def fetch_and_process(self):
-        """Fluxo principal: buscar, processar e armazenar e-mails"""
-        emails = self.parser.fetch_emails()
-        if not emails:
+        As mensagens fluem em lotes de ``fetch_batch_size``: cada lote é
+        baixado, processado e gravado antes do próximo, e o watermark avança
+        ao fim de cada lote, então uma falha no meio não perde o que já foi
+        gravado. Sem ``mail`` abre uma sessão IMAP só para esta execução; com
+        ``mail`` reaproveita a sessão já aberta (modo IDLE) e deixa os erros
+        propagarem.
+        """
+        if mail is not None:
+            self._process_stream(mail)
+            return
+        self.parser.uidvalidity = None
+        try:
+            with self.parser.connect() as session:
+                self._process_stream(session)
+        except Exception as e:
+            print(f"❌ Erro ao buscar/processar e-mails: {e}")
+
+    def _process_stream(self, mail):
+        watermark = self.db.get_watermark(self.parser.mailbox_key)
+        total = 0
+        with self._parse_pool() as pool:
+            for batch in self.parser.iter_new(mail, watermark, is_known=self.db.get_known_message_ids):
+                if batch:
+                    print(f"\n🔎 {len(batch)} e-mails encontrados. Processando...")
+                # Parsing e arquivo antes da transação: ela só faz os inserts e segura o banco pouco tempo
+                results = self._parse_batch(pool, batch)
+                self._archive_batch(batch)
+                # O lote inteiro e o watermark entram em um único commit
+                with self.db.transaction():
+                    for email_data, parsed in zip(batch, results):
+                        total += 1
+                        self.process_email(email_data, total, parsed)
+                    self._advance_watermark(watermark)
+        if not total:
             print("ℹ️ Nenhum e-mail novo encontrado.")
+            self._advance_watermark(watermark)
+
+    def _parse_pool(self):
+        if self.parse_workers > 1:
+            return ProcessPoolExecutor(max_workers=self.parse_workers)
+        return nullcontext()
+
+    def _parse_batch(self, pool, batch) -> List[Dict]:
+        """Parseia os corpos do lote, preservando a ordem; no pool quando houver, senão nesta thread"""
+        if pool is None or not batch:
+            return [parse_report(e["body"]) for e in batch]
+        chunksize = max(1, len(batch) // (self.parse_workers * 4))
+        return list(pool.map(parse_report, [e["body"] for e in batch], chunksize=chunksize))
+
+    def _archive_batch(self, batch):
+        """Grava no arquivo as mensagens brutas do lote, deixando a chave em ``raw_key``"""
+        if not self.archive:
             return
+        for email_data in batch:
+            if email_data.get("raw_key") is None and email_data.get("raw"):
+                email_data["raw_key"] = self.archive.put(email_data["raw"], email_data.get("message_id"))
 
-        print(f"\n🔎 {len(emails)} e-mails encontrados. Processando...")
+    def process_email(self, email_data: dict, index: int, parsed: Optional[Dict] = None) -> Optional[int]:
+        """Grava um e-mail já decodificado (subject, date, body) e os dados extraídos dele.
 
-        for i, email_data in enumerate(emails, 1):
-            date_obj, time_str = self.parser.parse_email_datetime(email_data["date"])
-            date_str = date_obj.strftime('%Y-%m-%d')
-            email_id = self.db.store_email(email_data["subject"], date_str, time_str)
+        ``parsed`` é o resultado de parse_report quando o parsing já foi feito
+        em outro processo; caso contrário o corpo é parseado aqui, apenas se o
+        e-mail for novo. O e-mail e seus registros são gravados em uma única
+        transação. Retorna o id do e-mail gravado ou None se já existia.
+        """
+        date_obj, time_str = self.parser.parse_email_datetime(email_data["date"])
+        date_str = date_obj.strftime('%Y-%m-%d')
+        raw_key = email_data.get("raw_key")
+        if raw_key is None and self.archive and email_data.get("raw"):
+            raw_key = self.archive.put(email_data["raw"], email_data.get("message_id"))
+        with self.db.transaction():
+            email_id = self.db.store_email(email_data["subject"], date_str, time_str,
+                                           email_data.get("message_id"), raw_key, int(date_obj.timestamp()))
             if email_id:
-                if self.parser.is_config_backup_email(email_data["body"]):
-                    config_info = self.parser.extract_config_backup_info(email_data["body"])
-                    if config_info:
-                        config_info["data_size"] = self.parser.clean_size_field(config_info.get("data_size", ""))
-                        config_info["backup_size"] = self.parser.clean_size_field(config_info.get("backup_size", ""))
-                        self.db.store_config_backup(email_id, config_info)
-                    self.db.mark_email_processed(email_id)
-                    print(f"✅ E-mail {i} (config backup) processado.")
-                else:
-                    jobs_info = self.parser.extract_jobs_info(email_data["body"])
-                    if jobs_info:
-                        for job_info, vm_list in jobs_info:
-                            job_info['total_size'] = self.parser.clean_size_field(job_info.get('total_size', ''))
-                            job_info['backup_size'] = self.parser.clean_size_field(job_info.get('backup_size', ''))
-                            job_info['data_read'] = self.parser.clean_size_field(job_info.get('data_read', ''))
-                            job_info['transferred'] = self.parser.clean_size_field(job_info.get('transferred', ''))
-                            job_id = self.db.store_job(email_id, job_info)
-                            if job_id and vm_list:
-                                self.db.store_vm_details(job_id, vm_list)
-                    self.db.mark_email_processed(email_id)
-                    print(f"✅ E-mail {i} processado.")
+                if parsed is None:
+                    parsed = parse_report(email_data["body"])
+                self.store_parsed(email_id, parsed)
+        if email_id and self.verbose:
+            kind = " (config backup)" if "config" in parsed else ""
+            print(f"✅ E-mail {index}{kind} processado.")
+        return email_id
+
+    def store_parsed(self, email_id: int, parsed: Dict):
+        """Grava os registros de parse_report e marca o e-mail com a versão do parser que os gerou"""
+        self.db.store_report(email_id, parsed, PARSER_VERSION)
+
+    def _advance_watermark(self, watermark):
+        """Grava o maior UID visto; recomeça do zero se o UIDVALIDITY mudou"""
+        uidvalidity = self.parser.uidvalidity
+        if uidvalidity is None:
+            return
+        last_uid = watermark[1] if watermark and watermark[0] == uidvalidity else 0
+        last_uid = max(last_uid, self.parser.highest_uid or 0)
+        self.db.update_watermark(self.parser.mailbox_key, uidvalidity, last_uid)
 
     def get_processed_emails(self):
         return self.db.get_processed_emails()
\ No newline at end of file
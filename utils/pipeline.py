@@ -0,0 +1,28 @@
+"""Leitura/parsing em processos paralelos com gravação em lotes (backfill e reparse)."""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List
+
+
+def run_batches(chunks: Iterable[List], load: Callable, store: Callable[[List], None],
+                workers: int, batch_size: int):
+    """Aplica ``load`` a cada item e entrega a ``store`` os resultados de cada lote, na ordem.
+
+    ``load`` roda nos processos do pool (precisa ser serializável); com mais
+    de 1 worker o lote seguinte já é enviado ao pool antes de gravar o atual.
+    ``store`` recebe a lista pronta, então a transação de gravação não fica
+    aberta esperando o parsing.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            store([load(item) for item in chunk])
+        return
+    chunksize = max(1, batch_size // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = None
+        for chunk in chunks:
+            results = pool.map(load, chunk, chunksize=chunksize)
+            if pending is not None:
+                store(list(pending))
+            pending = results
+        if pending is not None:
+            store(list(pending))
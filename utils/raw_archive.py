@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zstandard é opcional; sem ele o arquivo usa gzip
+    zstandard = None
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "raw_archive")
+
+
+class RawArchive:
+    """Arquivo local, comprimido e endereçado por conteúdo, das mensagens brutas.
+
+    A chave é o SHA-256 do Message-ID (ou dos bytes da mensagem quando não há
+    Message-ID) e o arquivo fica em ``<raiz>/ab/cd/<chave>.eml.zst`` (ou
+    ``.eml.gz`` sem o pacote zstandard). Gravar a mesma mensagem de novo não
+    faz nada, então vários processos podem gravar ao mesmo tempo.
+    """
+
+    def __init__(self, root: str = DEFAULT_ARCHIVE_DIR):
+        self.root = root
+
+    @staticmethod
+    def key_for(raw: bytes, message_id: Optional[str] = None) -> str:
+        data = message_id.encode("utf-8", "surrogateescape") if message_id else raw
+        return hashlib.sha256(data).hexdigest()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key + ext)
+
+    def put(self, raw: bytes, message_id: Optional[str] = None) -> str:
+        key = self.key_for(raw, message_id)
+        if self._find(key):
+            return key
+        if zstandard is not None:
+            path, data = self._path(key, ".eml.zst"), zstandard.ZstdCompressor(level=10).compress(raw)
+        else:
+            path, data = self._path(key, ".eml.gz"), gzip.compress(raw, compresslevel=6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Nome temporário único por chamada: processos e threads (uma por fonte no
+        # coordenador) podem gravar a mesma mensagem ao mesmo tempo
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=f"{key}.", suffix=".tmp",
+                                         delete=False) as f:
+            f.write(data)
+        os.replace(f.name, path)
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._find(key)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        if path.endswith(".gz"):
+            return gzip.decompress(data)
+        if zstandard is None:
+            raise RuntimeError(f"{path} requer o pacote zstandard para ser lido")
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    def _find(self, key: str) -> Optional[str]:
+        for ext in (".eml.zst", ".eml.gz"):
+            path = self._path(key, ext)
+            if os.path.exists(path):
+                return path
+        return None
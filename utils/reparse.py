@@ -0,0 +1,88 @@
+"""Reconstrói backup_jobs, backup_vms e config_backups a partir do arquivo local.
+
+Uso (a partir da raiz do projeto):
+    python -m utils.reparse                  # só e-mails parseados por versão antiga do parser
+    python -m utils.reparse --kind agent     # todos os e-mails de um tipo (config, agent, job)
+    python -m utils.reparse --all [--workers 8] [--batch-size 1000]
+
+Os e-mails selecionados são parseados de novo a partir da mensagem bruta
+arquivada, com o EmailParser atual, em processos paralelos e sem acessar o
+servidor IMAP; as linhas derivadas antigas são substituídas dentro da
+transação do lote, junto com a versão do parser gravada no e-mail.
+"""
+import argparse
+import os
+import time
+from functools import partial
+from typing import List, Optional, Tuple
+
+from utils.email_parser import EmailParser, PARSER_VERSION, REPORT_KINDS, parse_report
+from utils.email_processor import EmailProcessor
+from utils.pipeline import run_batches
+from utils.raw_archive import DEFAULT_ARCHIVE_DIR, RawArchive
+
+REPARSE_BATCH_SIZE = 1000
+
+
+def load_archived(item: Tuple[int, str], archive_dir: str) -> Tuple[int, Optional[dict]]:
+    """Lê a mensagem do arquivo e parseia o corpo; roda nos processos do pool"""
+    email_id, raw_key = item
+    try:
+        raw = RawArchive(archive_dir).get(raw_key)
+        if raw is None:
+            print(f"⚠️ E-mail {email_id}: mensagem {raw_key} não encontrada no arquivo")
+            return email_id, None
+        return email_id, parse_report(EmailParser.parse_message(raw)["body"])
+    except Exception as e:
+        print(f"⚠️ E-mail {email_id}: falha ao reparsear ({e})")
+        return email_id, None
+
+
+def reparse(db_name: str = "veeam_emails.db", archive_dir: str = DEFAULT_ARCHIVE_DIR,
+            workers: Optional[int] = None, batch_size: int = REPARSE_BATCH_SIZE,
+            only_stale: bool = True, kind: Optional[str] = None) -> int:
+    """Reparseia os e-mails arquivados selecionados; retorna quantos foram reconstruídos.
+
+    Com ``only_stale`` só entram os e-mails de versão anterior a PARSER_VERSION;
+    ``kind`` seleciona um tipo de relatório independentemente da versão.
+    """
+    processor = EmailProcessor(None, None, None, db_name=db_name)
+    db = processor.db
+    items = db.get_archived_emails(PARSER_VERSION if only_stale and kind is None else None, kind)
+    chunks: List[List[Tuple[int, str]]] = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    load = partial(load_archived, archive_dir=archive_dir)
+    workers = workers or os.cpu_count() or 1
+    rebuilt = 0
+
+    def store(results):
+        nonlocal rebuilt
+        with db.transaction():
+            for email_id, parsed in results:
+                if parsed is None:
+                    continue
+                db.clear_derived(email_id)
+                processor.store_parsed(email_id, parsed)
+                rebuilt += 1
+        print(f"🔁 {rebuilt}/{len(items)} e-mails reparseados...")
+
+    if not items:
+        print("ℹ️ Nenhum e-mail para reparsear.")
+        return 0
+    run_batches(chunks, load, store, workers, batch_size)
+    return rebuilt
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Reparse dos e-mails arquivados do Veeam")
+    arg_parser.add_argument("--db", default="veeam_emails.db", help="banco dentro da pasta database/")
+    arg_parser.add_argument("--archive", default=DEFAULT_ARCHIVE_DIR, help="pasta do arquivo de mensagens brutas")
+    arg_parser.add_argument("--workers", type=int, default=None, help="processos de leitura/parsing")
+    arg_parser.add_argument("--batch-size", type=int, default=REPARSE_BATCH_SIZE, help="e-mails por transação")
+    selection = arg_parser.add_mutually_exclusive_group()
+    selection.add_argument("--all", action="store_true", help="reparseia todos os e-mails arquivados")
+    selection.add_argument("--kind", choices=REPORT_KINDS, help="reparseia todos os e-mails deste tipo")
+    args = arg_parser.parse_args()
+
+    started = time.time()
+    total = reparse(args.db, args.archive, args.workers, args.batch_size, only_stale=not args.all, kind=args.kind)
+    print(f"✅ Reparse concluído: {total} e-mails reconstruídos em {time.time() - started:.1f}s")
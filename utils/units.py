@@ -0,0 +1,96 @@
+"""Conversão dos textos de tamanho, duração, taxa e horário dos relatórios Veeam para números.
+
+Os textos continuam gravados como vieram (para exibição); os valores
+numéricos ficam em colunas próprias para somas, tendências e ordenação no SQL.
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+_SIZE_RE = re.compile(r'^\s*([\d.,]+)\s*([KMGTP]?)B\b', re.IGNORECASE)
+_SIZE_UNITS = {"": 0, "K": 1, "M": 2, "G": 3, "T": 4, "P": 5}
+_DURATION_RE = re.compile(r'^\s*(?:(\d+)\.)?(\d+):(\d{1,2}):(\d{1,2})\s*$')
+_RATIO_RE = re.compile(r'^\s*([\d.,]+)\s*x?\s*$', re.IGNORECASE)
+_TIME_RE = re.compile(r'^\s*(?:(\d{1,2})/(\d{1,2})/(\d{4})\s+)?(\d{1,2}):(\d{2})(?::(\d{2}))?\s*$')
+
+
+def _to_float(number: str) -> Optional[float]:
+    # "1,5" e "1.5" são decimais; com os dois separadores, o último é o decimal
+    if "," in number and "." in number:
+        decimal = "," if number.rfind(",") > number.rfind(".") else "."
+        thousands = "." if decimal == "," else ","
+        number = number.replace(thousands, "")
+    try:
+        return float(number.replace(",", "."))
+    except ValueError:
+        return None
+
+
+def size_to_bytes(value: Optional[str]) -> Optional[int]:
+    """'1,5 TB' ou '1.5 TB' -> bytes (unidades binárias, como no Veeam); None se não reconhecer"""
+    if not value:
+        return None
+    m = _SIZE_RE.match(value)
+    if not m:
+        return None
+    number = _to_float(m.group(1))
+    if number is None:
+        return None
+    return int(round(number * 1024 ** _SIZE_UNITS[m.group(2).upper()]))
+
+
+def duration_to_seconds(value: Optional[str]) -> Optional[int]:
+    """'1:10:41' ou '1.02:03:04' (dias.horas:min:seg) -> segundos; None se não reconhecer"""
+    if not value:
+        return None
+    m = _DURATION_RE.match(value)
+    if not m:
+        return None
+    days, hours, minutes, seconds = (int(g) if g else 0 for g in m.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def ratio_to_float(value: Optional[str]) -> Optional[float]:
+    """'1,3x' -> 1.3; None se não reconhecer"""
+    if not value:
+        return None
+    m = _RATIO_RE.match(value)
+    return _to_float(m.group(1)) if m else None
+
+
+def local_to_epoch(date: Optional[str], time: Optional[str]) -> Optional[int]:
+    """'2024-01-03' + '22:05:10' no fuso do servidor -> epoch UTC (para registros sem fuso gravado)"""
+    if not date or not time:
+        return None
+    try:
+        return int(datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M:%S").timestamp())
+    except ValueError:
+        return None
+
+
+def report_time_to_epoch(value: Optional[str], sent_date: Optional[str], sent_time: Optional[str],
+                         sent_at: Optional[int]) -> Optional[int]:
+    """Horário de um job/VM do relatório ('22:00:00' ou '01/01/2024 22:00:00') -> epoch UTC.
+
+    Os horários do relatório estão no mesmo relógio do envio do e-mail
+    (``sent_date``/``sent_time``), então o epoch é o do envio menos a
+    diferença entre os dois. Sem data, vale o último horário igual ou
+    anterior ao envio (um job que começou ontem às 22h num e-mail de hoje).
+    """
+    if not value or sent_at is None:
+        return None
+    m = _TIME_RE.match(value)
+    if not m:
+        return None
+    try:
+        sent = datetime.strptime(f"{sent_date} {sent_time}", "%Y-%m-%d %H:%M:%S")
+        day, month, year, hour, minute, second = m.groups()
+        if year:
+            local = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second or 0))
+        else:
+            local = sent.replace(hour=int(hour), minute=int(minute), second=int(second or 0))
+            if local > sent:
+                local -= timedelta(days=1)
+    except (TypeError, ValueError):
+        return None
+    return sent_at - int((sent - local).total_seconds())